@@ -7,6 +7,9 @@ from pathlib import Path
 import platform
 import os
 
+from downloader.track import Track, TrackState
+from profiling.profiler import profiled
+
 
 class AppleMusicImporter:
     """Handles importing music files into Apple Music"""
@@ -16,6 +19,7 @@ class AppleMusicImporter:
             raise Exception("Apple Music integration is only available on macOS")
         self.delete_after_import = delete_after_import
     
+    @profiled('import')
     def import_file(self, file_path: Path) -> bool:
         """
         Import a music file into Apple Music
@@ -29,9 +33,40 @@ class AppleMusicImporter:
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        # Convert to absolute path
-        abs_path = file_path.resolve()
+        return self._add_to_music(file_path.resolve())
+    
+    @profiled('import')
+    def import_track(self, track: Track) -> bool:
+        """
+        Import a downloaded track into Apple Music, updating it in place
+        
+        The track's state, import timestamp and error are set from the
+        result. The file is not stat'ed again since the downloader already
+        recorded everything needed.
         
+        Args:
+            track: Track produced by SpotifyDownloader.download
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        track.mark(TrackState.IMPORTING)
+        abs_path = track.path if track.path.is_absolute() else track.path.resolve()
+        
+        try:
+            success = self._add_to_music(abs_path)
+        except Exception as e:
+            track.mark(TrackState.FAILED, str(e))
+            raise
+        
+        if success:
+            track.mark(TrackState.IMPORTED)
+        else:
+            track.mark(TrackState.FAILED, "Music rejected the file")
+        return success
+    
+    def _add_to_music(self, abs_path: Path) -> bool:
+        """Add an absolute file path to Music and optionally delete it afterwards"""
         # AppleScript to add file to Music
         applescript = f'''
         tell application "Music"
@@ -95,6 +130,33 @@ class AppleMusicImporter:
         
         return results
     
+    def import_tracks(self, tracks: list[Track]) -> dict:
+        """
+        Import multiple tracks into Apple Music, updating each in place
+        
+        Args:
+            tracks: List of tracks to import
+        
+        Returns:
+            Dictionary with 'success' and 'failed' lists of tracks
+        """
+        results = {
+            'success': [],
+            'failed': []
+        }
+        
+        for track in tracks:
+            try:
+                if self.import_track(track):
+                    results['success'].append(track)
+                else:
+                    results['failed'].append(track)
+            except Exception as e:
+                results['failed'].append(track)
+                print(f"Error importing {track.path}: {e}")
+        
+        return results
+    
     def is_music_running(self) -> bool:
         """Check if Apple Music is running"""
         applescript = '''
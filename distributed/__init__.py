@@ -0,0 +1 @@
+"""Networked download workers that drain a shared job queue"""
@@ -0,0 +1,115 @@
+"""
+Command line entry point for the distributed download service
+
+Usage:
+    python -m distributed coordinator [--host H] [--port P] [--output DIR] [--import]
+    python -m distributed worker --coordinator URL [--work-dir DIR] [--id ID]
+    python -m distributed submit URL --coordinator URL [--wait]
+
+Set SPOTIFY_DOWNLOADER_TOKEN (or pass --token) on every machine to require a
+shared secret. The coordinator listens on localhost unless --host is given.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from distributed.protocol import DEFAULT_PORT, CoordinatorClient
+
+
+def run_coordinator(args):
+    from distributed.coordinator import Coordinator, CoordinatorServer
+    from downloader.spotify_downloader import SpotifyDownloader
+
+    output_dir = Path(args.output).expanduser()
+    on_result = None
+    if args.import_to_music:
+        from apple_music.importer import AppleMusicImporter
+        importer = AppleMusicImporter()
+
+        def on_result(track):
+            if importer.import_track(track):
+                print(f"Imported {track.display_name}")
+            else:
+                print(f"Failed to import {track.display_name}: {track.error}")
+
+    resolver = SpotifyDownloader(Path(tempfile.mkdtemp(prefix='spotdl-resolve-')))
+    coordinator = Coordinator(output_dir, resolver.list_songs, on_result=on_result)
+    server = CoordinatorServer((args.host, args.port), coordinator, token=args.token)
+    print(f"Coordinator listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        coordinator.close()
+    return 0
+
+
+def run_worker(args):
+    from distributed.worker import DownloadWorker
+
+    client = CoordinatorClient(args.coordinator, token=args.token)
+    worker = DownloadWorker(client, Path(args.work_dir).expanduser(), worker_id=args.id)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+def run_submit(args):
+    client = CoordinatorClient(args.coordinator, token=args.token)
+    job_id = client.post('/jobs', {'url': args.url})['job_id']
+    print(f"Submitted job {job_id}")
+    if not args.wait:
+        return 0
+
+    while True:
+        status = client.get(f"/jobs/{job_id}")
+        done = len(status['completed']) + len(status['failed'])
+        print(f"{status['state']}: {done}/{status['total']}")
+        if status['state'] in ('done', 'failed'):
+            for entry in status['failed']:
+                print(f"Failed: {entry['title']}: {entry['error']}")
+            if status.get('error'):
+                print(f"Error: {status['error']}")
+            return 0 if status['state'] == 'done' and not status['failed'] else 1
+        time.sleep(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m distributed')
+    parser.add_argument('--token', default=os.environ.get('SPOTIFY_DOWNLOADER_TOKEN'))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    coordinator = commands.add_parser('coordinator', help='Hand out track leases to workers')
+    coordinator.add_argument('--host', default='127.0.0.1')
+    coordinator.add_argument('--port', type=int, default=DEFAULT_PORT)
+    coordinator.add_argument('--output', default=str(Path.home() / "Music" / "Spotify Downloads"))
+    coordinator.add_argument('--import', dest='import_to_music', action='store_true',
+                             help='Import received files into Apple Music')
+    coordinator.set_defaults(func=run_coordinator)
+
+    worker = commands.add_parser('worker', help='Download leased tracks')
+    worker.add_argument('--coordinator', default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    worker.add_argument('--work-dir', default=str(Path(tempfile.gettempdir()) / 'spotdl-worker'))
+    worker.add_argument('--id', default=None)
+    worker.set_defaults(func=run_worker)
+
+    submit = commands.add_parser('submit', help='Queue a Spotify URL')
+    submit.add_argument('url')
+    submit.add_argument('--coordinator', default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    submit.add_argument('--wait', action='store_true', help='Wait until the job finishes')
+    submit.set_defaults(func=run_submit)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
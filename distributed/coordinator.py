@@ -0,0 +1,438 @@
+"""
+Coordinator that hands out track leases to download workers
+
+Jobs are Spotify URLs. The coordinator resolves each job into its songs and
+queues one lease per song. Workers pull leases, heartbeat while they work
+and upload verified files back here, so the Apple Music import happens on
+the coordinator's machine. Uploads must carry the SHA-256 the worker
+computed while verifying, and are rejected if the received bytes differ.
+Leases held by workers that stop heartbeating are put back in the queue.
+
+API (JSON over HTTP):
+    POST /jobs                {"url"}                     -> {"job_id"}
+    GET  /jobs/<job_id>                                   -> job status and manifest
+    POST /lease               {"worker_id", "count"}      -> {"leases": [...]}
+    POST /heartbeat           {"worker_id"}               -> {"leases": [lease ids still held]}
+    POST /complete            {"worker_id", "lease_id", "error"}
+    PUT  /results/<lease_id>  audio file body, X-Worker-Id, X-File-Name and
+                              X-Content-SHA256 headers
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from distributed.protocol import CHECKSUM_HEADER, LEASE_TIMEOUT, MAX_ATTEMPTS, TOKEN_HEADER
+from downloader.track import Track, TrackState
+
+
+# Bytes copied per read while receiving an upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class Lease:
+    """A song handed to one worker until it completes or expires"""
+
+    __slots__ = ('lease_id', 'job_id', 'song', 'attempts', 'worker_id', 'expires_at')
+
+    def __init__(self, job_id: str, song: dict, attempts: int = 0):
+        self.lease_id = None
+        self.job_id = job_id
+        self.song = song
+        self.attempts = attempts
+        self.worker_id = None
+        self.expires_at = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'lease_id': self.lease_id,
+            'job_id': self.job_id,
+            'track_url': self.song.get('url'),
+            'spotify_id': self.song.get('song_id'),
+            'duration': self.song.get('duration'),
+            'expires_in': max(0.0, self.expires_at - time.monotonic()),
+        }
+
+
+class Coordinator:
+    """Thread-safe job, lease and manifest bookkeeping"""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        resolve_songs: Callable[[str], List[dict]],
+        on_result: Optional[Callable[[Track], None]] = None,
+        lease_timeout: float = LEASE_TIMEOUT
+    ):
+        """
+        Args:
+            output_dir: Where uploaded files are published
+            resolve_songs: Function turning a Spotify URL into spotdl song dictionaries
+            on_result: Optional callback run for every received track (e.g.
+                import); it runs on a background thread so a slow import
+                never holds up the upload response
+            lease_timeout: Seconds without a heartbeat before a lease is reclaimed
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.incoming_dir = self.output_dir / '.incoming'
+        self.incoming_dir.mkdir(exist_ok=True)
+        self.resolve_songs = resolve_songs
+        self.on_result = on_result
+        self.lease_timeout = lease_timeout
+        self.jobs: Dict[str, dict] = {}
+        self.workers: Dict[str, float] = {}
+        self._pending = deque()
+        self._leases: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        self._results = queue.Queue()
+        self._result_thread = None
+        if on_result is not None:
+            self._result_thread = threading.Thread(target=self._result_loop, daemon=True)
+            self._result_thread.start()
+
+    def submit(self, url: str) -> str:
+        """Register a job and resolve its songs in the background"""
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'url': url,
+                'state': 'resolving',
+                'total': 0,
+                'completed': [],
+                'failed': [],
+                'reclaimed': 0,
+                'error': None,
+            }
+        threading.Thread(target=self._resolve, args=(job_id, url), daemon=True).start()
+        return job_id
+
+    def _resolve(self, job_id: str, url: str):
+        try:
+            songs = self.resolve_songs(url)
+        except Exception as e:
+            with self._lock:
+                self.jobs[job_id].update(state='failed', error=str(e))
+            return
+
+        with self._lock:
+            job = self.jobs[job_id]
+            job['total'] = len(songs)
+            job['state'] = 'running' if songs else 'done'
+            for song in songs:
+                self._pending.append(Lease(job_id, song))
+
+    def job_status(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return json.loads(json.dumps(job))
+
+    def lease(self, worker_id: str, count: int) -> List[dict]:
+        """Hand up to count pending songs to a worker"""
+        now = time.monotonic()
+        leases = []
+        with self._lock:
+            self.workers[worker_id] = now
+            self._reclaim_expired(now)
+            while self._pending and len(leases) < count:
+                lease = self._pending.popleft()
+                lease.lease_id = uuid.uuid4().hex
+                lease.worker_id = worker_id
+                lease.attempts += 1
+                lease.expires_at = now + self.lease_timeout
+                self._leases[lease.lease_id] = lease
+                leases.append(lease.to_dict())
+        return leases
+
+    def heartbeat(self, worker_id: str) -> List[str]:
+        """Extend every lease the worker holds; returns the ones still valid"""
+        now = time.monotonic()
+        held = []
+        with self._lock:
+            self.workers[worker_id] = now
+            self._reclaim_expired(now)
+            for lease in self._leases.values():
+                if lease.worker_id == worker_id:
+                    lease.expires_at = now + self.lease_timeout
+                    held.append(lease.lease_id)
+        return held
+
+    def fail(self, worker_id: str, lease_id: str, error: str) -> bool:
+        """Record a failed attempt, re-queueing the song if it has attempts left"""
+        with self._lock:
+            lease = self._take_lease(worker_id, lease_id)
+            if lease is None:
+                return False
+            self._retry_or_fail(lease, error)
+            return True
+
+    def receive(
+        self,
+        worker_id: str,
+        lease_id: str,
+        file_name: str,
+        stream,
+        length: int,
+        checksum: str
+    ) -> Optional[Track]:
+        """
+        Stream an uploaded file into the output directory and complete its lease
+
+        Args:
+            checksum: SHA-256 the worker computed while verifying the file
+
+        Returns:
+            The received track, or None if the lease is unknown or expired
+
+        Raises:
+            ValueError: If the upload is empty, incomplete or does not match
+                its checksum
+        """
+        if length <= 0:
+            raise ValueError("Upload is empty")
+        if not checksum:
+            raise ValueError(f"Missing {CHECKSUM_HEADER} header")
+
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.worker_id != worker_id:
+                return None
+
+        name = os.path.basename(file_name)
+        if not name or name.startswith('.'):
+            raise ValueError(f"Invalid file name: {file_name!r}")
+
+        partial = self.incoming_dir / f"{lease_id}.part"
+        digest = hashlib.sha256()
+        remaining = length
+        with open(partial, 'wb') as f:
+            while remaining > 0:
+                chunk = stream.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                remaining -= len(chunk)
+        if remaining:
+            os.remove(partial)
+            raise ValueError("Upload ended early")
+        if digest.hexdigest() != checksum.lower():
+            os.remove(partial)
+            raise ValueError("Upload does not match the worker's checksum")
+
+        with self._lock:
+            lease = self._take_lease(worker_id, lease_id)
+            if lease is None:
+                # Expired and handed to another worker while uploading
+                os.remove(partial)
+                return None
+            destination = self.output_dir / name
+            os.replace(partial, destination)
+            # The worker verified the file and the bytes match what it checked
+            track = Track(
+                destination,
+                spotify_id=lease.song.get('song_id'),
+                title=lease.song.get('name'),
+                size=length,
+                duration=lease.song.get('duration'),
+                state=TrackState.VERIFIED,
+            )
+            track.checksum = digest.hexdigest()
+            self.jobs[lease.job_id]['completed'].append({
+                'spotify_id': track.spotify_id,
+                'title': track.title,
+                'file': name,
+                'size': length,
+                'sha256': track.checksum,
+                'worker_id': worker_id,
+            })
+            self._finish_job_if_done(lease.job_id)
+
+        if self.on_result is not None:
+            self._results.put(track)
+        return track
+
+    def _result_loop(self):
+        """Hand received tracks to on_result one at a time"""
+        while True:
+            track = self._results.get()
+            if track is None:
+                return
+            try:
+                self.on_result(track)
+            except Exception as e:
+                print(f"Error handling {track.name}: {e}")
+
+    def close(self):
+        """Wait for queued on_result calls (e.g. imports) to finish"""
+        if self._result_thread is not None:
+            pending = self._results.qsize()
+            if pending:
+                print(f"Finishing {pending} queued result(s)...")
+            self._results.put(None)
+            self._result_thread.join()
+            self._result_thread = None
+
+    def _take_lease(self, worker_id: str, lease_id: str) -> Optional[Lease]:
+        lease = self._leases.get(lease_id)
+        if lease is None or lease.worker_id != worker_id:
+            return None
+        return self._leases.pop(lease_id)
+
+    def _retry_or_fail(self, lease: Lease, error: str):
+        if lease.attempts < MAX_ATTEMPTS:
+            lease.worker_id = None
+            self._pending.append(lease)
+            return
+        self.jobs[lease.job_id]['failed'].append({
+            'spotify_id': lease.song.get('song_id'),
+            'title': lease.song.get('name'),
+            'error': error,
+        })
+        self._finish_job_if_done(lease.job_id)
+
+    def _reclaim_expired(self, now: float):
+        """Put leases from workers that stopped heartbeating back in the queue"""
+        expired = [lease for lease in self._leases.values() if lease.expires_at <= now]
+        for lease in expired:
+            del self._leases[lease.lease_id]
+            self.jobs[lease.job_id]['reclaimed'] += 1
+            self._retry_or_fail(lease, f"Lease expired on worker {lease.worker_id}")
+
+    def _finish_job_if_done(self, job_id: str):
+        job = self.jobs[job_id]
+        if len(job['completed']) + len(job['failed']) >= job['total']:
+            job['state'] = 'done'
+
+    def reap(self):
+        """Reclaim expired leases; called periodically by the server"""
+        with self._lock:
+            self._reclaim_expired(time.monotonic())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Routes API requests to the coordinator attached to the server"""
+
+    def _authorized(self) -> bool:
+        token = self.server.token
+        if token and self.headers.get(TOKEN_HEADER) != token:
+            self._reply(403, {'error': 'Invalid token'})
+            return False
+        return True
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        parts = self.path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'jobs':
+            status = self.server.coordinator.job_status(parts[1])
+            if status is None:
+                self._reply(404, {'error': 'Unknown job'})
+            else:
+                self._reply(200, status)
+        else:
+            self._reply(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        coordinator = self.server.coordinator
+        try:
+            payload = self._json_body()
+        except ValueError:
+            self._reply(400, {'error': 'Invalid JSON'})
+            return
+
+        if self.path == '/jobs' and payload.get('url'):
+            self._reply(200, {'job_id': coordinator.submit(payload['url'])})
+        elif self.path == '/lease' and payload.get('worker_id'):
+            count = max(1, int(payload.get('count', 1)))
+            self._reply(200, {'leases': coordinator.lease(payload['worker_id'], count)})
+        elif self.path == '/heartbeat' and payload.get('worker_id'):
+            self._reply(200, {'leases': coordinator.heartbeat(payload['worker_id'])})
+        elif self.path == '/complete' and payload.get('worker_id') and payload.get('lease_id'):
+            ok = coordinator.fail(
+                payload['worker_id'],
+                payload['lease_id'],
+                payload.get('error') or 'Unknown error'
+            )
+            self._reply(200 if ok else 409, {'ok': ok})
+        else:
+            self._reply(400, {'error': 'Bad request'})
+
+    def do_PUT(self):
+        if not self._authorized():
+            return
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'results':
+            self._reply(404, {'error': 'Not found'})
+            return
+        if self.headers.get('Content-Length') is None:
+            self._reply(411, {'error': 'Content-Length required'})
+            return
+        try:
+            track = self.server.coordinator.receive(
+                self.headers.get('X-Worker-Id', ''),
+                parts[1],
+                self.headers.get('X-File-Name', ''),
+                self.rfile,
+                int(self.headers['Content-Length']),
+                self.headers.get(CHECKSUM_HEADER, '')
+            )
+        except ValueError as e:
+            self._reply(400, {'error': str(e)})
+            return
+        if track is None:
+            self._reply(409, {'error': 'Lease is no longer held by this worker'})
+        else:
+            self._reply(200, {'ok': True, 'sha256': track.checksum})
+
+    def log_message(self, format, *args):
+        # Keep the console for job progress rather than access logs
+        pass
+
+
+class CoordinatorServer(ThreadingHTTPServer):
+    """HTTP server exposing a Coordinator"""
+
+    daemon_threads = True
+
+    def __init__(self, address, coordinator: Coordinator, token: Optional[str] = None):
+        super().__init__(address, _Handler)
+        self.coordinator = coordinator
+        self.token = token
+        self._reaper_stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        interval = max(1.0, self.coordinator.lease_timeout / 4)
+        while not self._reaper_stop.wait(interval):
+            self.coordinator.reap()
+
+    def server_close(self):
+        self._reaper_stop.set()
+        super().server_close()
@@ -0,0 +1,74 @@
+"""
+HTTP/JSON helpers shared by the coordinator and workers
+"""
+
+import json
+import urllib.error
+import urllib.request
+from typing import BinaryIO, Dict, Optional
+
+
+DEFAULT_PORT = 8765
+
+# Header carrying the shared secret when the coordinator requires one
+TOKEN_HEADER = 'X-Auth-Token'
+
+# Header carrying the SHA-256 the worker computed while verifying an upload
+CHECKSUM_HEADER = 'X-Content-SHA256'
+
+# A lease expires if its worker sends no heartbeat for this many seconds
+LEASE_TIMEOUT = 60.0
+
+# Attempts per track before it is reported as failed
+MAX_ATTEMPTS = 3
+
+
+class CoordinatorClient:
+    """Minimal client for the coordinator API"""
+
+    def __init__(self, base_url: str, token: Optional[str] = None, timeout: float = 30.0):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def _headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        headers = dict(extra or {})
+        if self.token:
+            headers[TOKEN_HEADER] = self.token
+        return headers
+
+    def _send(self, request: urllib.request.Request) -> dict:
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8') or '{}')
+        except urllib.error.HTTPError as e:
+            message = e.read().decode('utf-8', errors='replace')
+            raise Exception(f"Coordinator returned {e.code}: {message}")
+
+    def get(self, path: str) -> dict:
+        """GET a JSON document"""
+        request = urllib.request.Request(self.base_url + path, headers=self._headers())
+        return self._send(request)
+
+    def post(self, path: str, payload: dict) -> dict:
+        """POST a JSON payload and return the JSON response"""
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode('utf-8'),
+            headers=self._headers({'Content-Type': 'application/json'}),
+            method='POST'
+        )
+        return self._send(request)
+
+    def upload(self, path: str, stream: BinaryIO, size: int, headers: Dict[str, str]) -> dict:
+        """PUT a file body, streamed from an open file object"""
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=stream,
+            headers=self._headers(dict(headers, **{
+                'Content-Type': 'application/octet-stream',
+                'Content-Length': str(size),
+            })),
+            method='PUT'
+        )
+        return self._send(request)
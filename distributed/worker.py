@@ -0,0 +1,132 @@
+"""
+Download worker that drains a coordinator's job queue
+"""
+
+import os
+import shutil
+import socket
+import threading
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from distributed.protocol import CHECKSUM_HEADER, LEASE_TIMEOUT, CoordinatorClient
+from downloader.spotify_downloader import SpotifyDownloader
+from downloader.verifier import verify_file
+
+
+class DownloadWorker:
+    """
+    Leases songs from the coordinator, downloads them and uploads the files
+
+    Each worker downloads into its own directory, so several workers can run
+    on one machine without picking up each other's files. Files are verified
+    before upload and sent with their SHA-256, so the coordinator only ever
+    receives intact files.
+    """
+
+    def __init__(
+        self,
+        client: CoordinatorClient,
+        work_dir: Path,
+        worker_id: Optional[str] = None,
+        poll_interval: float = 5.0,
+        lease_timeout: float = LEASE_TIMEOUT
+    ):
+        """
+        Args:
+            client: Client for the coordinator API
+            work_dir: Parent of this worker's private download directory
+            worker_id: Stable name for this worker; generated if omitted
+            poll_interval: Seconds to wait when the queue is empty
+            lease_timeout: The coordinator's lease timeout; heartbeats are
+                sent three times per timeout
+        """
+        self.client = client
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.work_dir = Path(work_dir) / self.worker_id
+        self.downloader = SpotifyDownloader(self.work_dir)
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """Process leases until stop() is called"""
+        heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        heartbeat.start()
+        print(f"Worker {self.worker_id} started")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    leases = self.client.post('/lease', {'worker_id': self.worker_id, 'count': 1})['leases']
+                except Exception as e:
+                    print(f"Could not reach coordinator: {e}")
+                    leases = []
+
+                if not leases:
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                for lease in leases:
+                    self._process(lease)
+        finally:
+            self.stop_event.set()
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _heartbeat_loop(self):
+        while not self.stop_event.wait(self.lease_timeout / 3):
+            try:
+                self.client.post('/heartbeat', {'worker_id': self.worker_id})
+            except Exception as e:
+                print(f"Heartbeat failed: {e}")
+
+    def _process(self, lease: dict):
+        """Download, verify and upload one leased song, or report the failure"""
+        lease_id = lease['lease_id']
+        try:
+            if not lease.get('track_url'):
+                raise Exception("Lease has no track URL")
+            tracks = self.downloader.download(lease['track_url'], overwrite=True)
+            if not tracks:
+                raise Exception("No file was downloaded")
+
+            # One song per lease, so verify inline rather than start a pool
+            track = tracks[0]
+            error, track.checksum, _ = verify_file(
+                str(track.path),
+                checksum=True,
+                expected_duration=track.duration or lease.get('duration')
+            )
+            if error is not None:
+                raise Exception(f"Verification failed: {error}")
+
+            with open(track.path, 'rb') as f:
+                self.client.upload(
+                    f"/results/{lease_id}",
+                    f,
+                    track.size,
+                    {
+                        'X-Worker-Id': self.worker_id,
+                        'X-File-Name': track.name,
+                        CHECKSUM_HEADER: track.checksum,
+                    }
+                )
+            print(f"Uploaded {track.name}")
+        except Exception as e:
+            print(f"Failed {lease.get('track_url')}: {e}")
+            try:
+                self.client.post('/complete', {
+                    'worker_id': self.worker_id,
+                    'lease_id': lease_id,
+                    'error': str(e),
+                })
+            except Exception as report_error:
+                print(f"Could not report failure: {report_error}")
+        finally:
+            # Nothing is kept locally; the coordinator owns the result
+            for entry in os.scandir(self.work_dir):
+                if entry.is_file():
+                    os.remove(entry.path)
@@ -0,0 +1,85 @@
+"""
+Cooperative cancellation for download jobs
+"""
+
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, List, Optional
+
+
+# Seconds between cancellation checks while waiting on a worker process
+POLL_INTERVAL = 0.05
+
+
+class DownloadCancelled(Exception):
+    """Raised when a job is cancelled while it is running"""
+
+
+class CancellationToken:
+    """
+    Signals cancellation to a running job
+
+    Besides the flag that workers poll between steps, callbacks can be
+    registered to react immediately (e.g. killing a child process), so a
+    cancel does not have to wait for a blocking call to return.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        """True once cancel() has been called"""
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel the job and run every registered callback"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Warning: cancel callback failed: {e}")
+
+    def register(self, callback: Callable[[], None]):
+        """Run callback on cancel, or right away if already cancelled"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def unregister(self, callback: Callable[[], None]):
+        """Remove a callback added with register()"""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        """Raise DownloadCancelled if the job has been cancelled"""
+        if self._event.is_set():
+            raise DownloadCancelled("Job was cancelled")
+
+
+def wait_for_result(future: Future, cancel_token: Optional[CancellationToken] = None):
+    """
+    Wait for a future's result, giving up as soon as the job is cancelled
+
+    Raises:
+        DownloadCancelled: If cancel_token is cancelled while waiting
+    """
+    if cancel_token is None:
+        return future.result()
+    while True:
+        cancel_token.raise_if_cancelled()
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except FutureTimeout:
+            pass
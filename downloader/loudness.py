@@ -0,0 +1,314 @@
+"""
+ReplayGain / EBU R128 loudness analysis using NumPy
+
+Each file is decoded once by ffmpeg into a 48 kHz stereo float PCM stream
+that is processed in fixed-size windows, so memory stays bounded no matter
+how long the track is. K-weighting is applied in the frequency domain on
+100 ms sub-blocks (the filter's magnitude response is all that matters for
+mean-square power), which keeps the whole measurement vectorized.
+"""
+
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from mutagen import File as MutagenFile
+from mutagen.id3 import ID3, COMM, TXXX
+from mutagen.mp4 import MP4FreeForm, MP4Tags
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from downloader.cancellation import CancellationToken, wait_for_result
+from downloader.diskio import bytes_written
+from downloader.spotify_downloader import find_ffmpeg
+from downloader.track import Track, TrackState
+from profiling.profiler import profiled
+
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+
+# BS.1770 gating blocks are 400 ms with 75% overlap, i.e. four 100 ms steps
+SUB_BLOCK_FRAMES = SAMPLE_RATE // 10
+SUB_BLOCKS_PER_BLOCK = 4
+
+# PCM frames read from ffmpeg per window (10 seconds, ~3.8 MB of float32)
+WINDOW_FRAMES = SUB_BLOCK_FRAMES * 100
+
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# ReplayGain 2.0 reference level
+REFERENCE_LOUDNESS = -18.0
+
+# BS.1770 K-weighting biquads at 48 kHz (high shelf, then high pass)
+SHELF_B = (1.53512485958697, -2.69169618940638, 1.19839281085285)
+SHELF_A = (1.0, -1.69065929318241, 0.73248077421585)
+HIGHPASS_B = (1.0, -2.0, 1.0)
+HIGHPASS_A = (1.0, -1.99004745483398, 0.99007225036621)
+
+
+def is_available() -> bool:
+    """Check whether NumPy is installed so the analysis stage can run"""
+    return np is not None
+
+
+def _k_weighting_power(frames: int):
+    """
+    Per-bin weights that turn |rfft|^2 of a block into its K-weighted mean square
+    """
+    w = np.linspace(0, np.pi, frames // 2 + 1)
+    z = np.exp(-1j * w)
+
+    def response(b, a):
+        return (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+
+    gain = np.abs(response(SHELF_B, SHELF_A) * response(HIGHPASS_B, HIGHPASS_A)) ** 2
+
+    # Parseval for a real FFT: interior bins stand for two conjugate bins
+    gain[1:(frames + 1) // 2] *= 2
+    return gain / (frames * frames)
+
+
+class LoudnessMeter:
+    """Accumulates K-weighted power of a PCM stream fed in arbitrary windows"""
+
+    def __init__(self):
+        self._weights = _k_weighting_power(SUB_BLOCK_FRAMES)
+        self._powers = []
+        self._remainder = np.empty((0, CHANNELS), dtype=np.float32)
+        self.peak = 0.0
+
+    def add(self, samples):
+        """
+        Feed decoded float samples shaped (frames, channels)
+
+        Only whole 100 ms sub-blocks are measured; leftover frames are kept
+        for the next call.
+        """
+        if len(samples) == 0:
+            return
+        self.peak = max(self.peak, float(np.max(np.abs(samples))))
+
+        if len(self._remainder):
+            samples = np.concatenate((self._remainder, samples))
+        usable = len(samples) - len(samples) % SUB_BLOCK_FRAMES
+        self._remainder = samples[usable:].copy()
+        if not usable:
+            return
+
+        blocks = samples[:usable].reshape(-1, SUB_BLOCK_FRAMES, CHANNELS)
+        spectrum = np.fft.rfft(blocks, axis=1)
+        power = np.einsum(
+            'bfc,f->bc',
+            spectrum.real ** 2 + spectrum.imag ** 2,
+            self._weights
+        )
+        # Channel weights are 1.0 for left and right
+        self._powers.append(power.sum(axis=1))
+
+    def integrated_loudness(self) -> float:
+        """Gated integrated loudness in LUFS (-inf for silence)"""
+        if not self._powers:
+            return float('-inf')
+        sub_powers = np.concatenate(self._powers)
+        if len(sub_powers) < SUB_BLOCKS_PER_BLOCK:
+            return float('-inf')
+
+        # 400 ms blocks from a running sum over four 100 ms sub-blocks
+        cumulative = np.concatenate(([0.0], np.cumsum(sub_powers)))
+        block_powers = (
+            cumulative[SUB_BLOCKS_PER_BLOCK:] - cumulative[:-SUB_BLOCKS_PER_BLOCK]
+        ) / SUB_BLOCKS_PER_BLOCK
+
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(block_powers)
+
+        gated = block_powers[block_loudness > ABSOLUTE_GATE]
+        if not len(gated):
+            return float('-inf')
+
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE
+        gated = block_powers[block_loudness > max(ABSOLUTE_GATE, relative_gate)]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def measure_file(path: str, ffmpeg: str) -> Tuple[float, float]:
+    """
+    Decode a file once and measure it
+
+    Returns:
+        Tuple of (integrated loudness in LUFS, sample peak)
+    """
+    # Damaged files can make ffmpeg log more than a pipe holds while stdout
+    # is being read, so its errors go to a file instead
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(
+            [
+                ffmpeg, '-nostdin', '-v', 'error',
+                '-i', path,
+                '-f', 'f32le', '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE),
+                '-'
+            ],
+            stdout=subprocess.PIPE,
+            stderr=errors
+        )
+        meter = LoudnessMeter()
+        window_bytes = WINDOW_FRAMES * CHANNELS * 4
+        try:
+            while True:
+                data = process.stdout.read(window_bytes)
+                if not data:
+                    break
+                usable = len(data) - len(data) % (CHANNELS * 4)
+                meter.add(np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, CHANNELS))
+        finally:
+            process.stdout.close()
+            process.wait()
+
+        if process.returncode != 0:
+            errors.seek(0)
+            stderr = errors.read().decode('utf-8', errors='replace')
+            raise Exception(f"ffmpeg could not decode {path}: {stderr.strip()}")
+    return meter.integrated_loudness(), meter.peak
+
+
+def _sound_check(gain: float) -> str:
+    """Format a gain as an iTunNORM value so Apple Music's Sound Check uses it"""
+    scale = 10 ** (-gain / 10)
+    values = [
+        min(65534, round(1000 * scale)),
+        min(65534, round(1000 * scale)),
+        min(65534, round(2500 * scale)),
+        min(65534, round(2500 * scale)),
+        0, 0, 0, 0, 0, 0,
+    ]
+    return ' ' + ' '.join(f"{value:08X}" for value in values)
+
+
+def write_gain_tags(path: str, gain: float, peak: float):
+    """Write ReplayGain and Sound Check tags with mutagen"""
+    audio = MutagenFile(path)
+    if audio is None:
+        raise Exception(f"Unrecognized audio format: {path}")
+    if audio.tags is None:
+        audio.add_tags()
+
+    gain_text = f"{gain:+.2f} dB"
+    peak_text = f"{peak:.6f}"
+    if isinstance(audio.tags, ID3):
+        audio.tags.add(TXXX(encoding=3, desc='REPLAYGAIN_TRACK_GAIN', text=[gain_text]))
+        audio.tags.add(TXXX(encoding=3, desc='REPLAYGAIN_TRACK_PEAK', text=[peak_text]))
+        audio.tags.add(COMM(encoding=3, lang='eng', desc='iTunNORM', text=[_sound_check(gain)]))
+    elif isinstance(audio.tags, MP4Tags):
+        prefix = '----:com.apple.iTunes:'
+        audio.tags[prefix + 'replaygain_track_gain'] = [MP4FreeForm(gain_text.encode('utf-8'))]
+        audio.tags[prefix + 'replaygain_track_peak'] = [MP4FreeForm(peak_text.encode('utf-8'))]
+        audio.tags[prefix + 'iTunNORM'] = [MP4FreeForm(_sound_check(gain).encode('utf-8'))]
+    else:
+        audio.tags['REPLAYGAIN_TRACK_GAIN'] = gain_text
+        audio.tags['REPLAYGAIN_TRACK_PEAK'] = peak_text
+    audio.save()
+
+
+def analyze_file(path: str, ffmpeg: str) -> Tuple[Optional[str], Optional[float], Optional[float], Optional[int], int]:
+    """
+    Measure a file and tag it with its gain
+
+    Runs in a worker process, so it only takes and returns picklable values.
+    Each worker runs one file at a time, so the process's own write counter
+    measures the tag rewrite. Where there is no counter, the whole file is
+    assumed to have been rewritten.
+
+    Returns:
+        Tuple of (error message or None, loudness in LUFS, gain in dB,
+        file size after tagging, bytes written while tagging)
+    """
+    try:
+        loudness, peak = measure_file(path, ffmpeg)
+        if loudness == float('-inf'):
+            return "Track is silent", None, None, None, 0
+        gain = REFERENCE_LOUDNESS - loudness
+        written_before = bytes_written()
+        write_gain_tags(path, gain, peak)
+        written_after = bytes_written()
+        size = os.path.getsize(path)
+        if written_before is None or written_after is None:
+            return None, loudness, gain, size, size
+        return None, loudness, gain, size, written_after - written_before
+    except Exception as e:
+        return str(e), None, None, None, 0
+
+
+class LoudnessAnalyzer:
+    """Measures loudness and writes gain tags for tracks in a process pool"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if not is_available():
+            raise Exception("Loudness analysis requires NumPy: pip install numpy")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.ffmpeg = find_ffmpeg()
+
+    @profiled('loudness')
+    def analyze(
+        self,
+        tracks: List[Track],
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Track]:
+        """
+        Analyze tracks in place, setting their loudness and gain
+
+        Tracks that could not be analyzed keep their state and are still
+        importable; only the tags are missing. Tagged tracks lose their
+        verification checksum, since the file has changed.
+
+        Args:
+            tracks: Verified tracks
+            progress_callback: Optional callback function(current, total, message)
+            cancel_token: Optional token; cancelling it stops waiting right
+                away and drops the files that have not started
+
+        Returns:
+            List of tracks that could not be analyzed
+
+        Raises:
+            DownloadCancelled: If cancel_token was cancelled
+        """
+        tracks = [track for track in tracks if track.state != TrackState.FAILED]
+        if not tracks:
+            return []
+
+        workers = min(self.max_workers, len(tracks))
+        failed = []
+
+        executor = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(analyze_file, str(track.path), self.ffmpeg) for track in tracks]
+            for i, (track, future) in enumerate(zip(tracks, futures)):
+                error, loudness, gain, size, written = wait_for_result(future, cancel_token)
+                if error is None:
+                    track.loudness = loudness
+                    track.gain = gain
+                    track.size = size
+                    track.bytes_written += written
+                    # The file changed after verification hashed it
+                    track.checksum = None
+                    message = f"{track.name}: {loudness:.1f} LUFS, gain {gain:+.2f} dB"
+                else:
+                    failed.append(track)
+                    message = f"Could not analyze {track.name}: {error}"
+
+                if progress_callback:
+                    progress_callback(i + 1, len(tracks), message)
+        finally:
+            # A file being tagged when the job is cancelled finishes in the background
+            cancelled = cancel_token is not None and cancel_token.cancelled
+            executor.shutdown(wait=not cancelled, cancel_futures=True)
+
+        return failed
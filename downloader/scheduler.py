@@ -0,0 +1,202 @@
+"""
+Priority-aware job scheduler for download jobs
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional
+
+from downloader.cancellation import CancellationToken, DownloadCancelled
+
+
+class JobPriority:
+    """Lower values run first"""
+
+    INTERACTIVE = 0
+    BULK = 10
+
+
+class JobState:
+    """Lifecycle states of a download job"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+def classify_url(url: str) -> int:
+    """Single tracks are interactive; albums and playlists are bulk work"""
+    return JobPriority.INTERACTIVE if '/track/' in url else JobPriority.BULK
+
+
+class DownloadJob:
+    """A queued or running download with its cancellation token and timings"""
+
+    def __init__(self, url: str, priority: int, options: Optional[dict] = None):
+        self.url = url
+        self.priority = priority
+        self.options = options or {}
+        self.token = CancellationToken()
+        self.state = JobState.QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.first_track_at = None
+        self.finished_at = None
+        self.tracks = []
+        self.error = None
+
+    @property
+    def is_interactive(self) -> bool:
+        return self.priority <= JobPriority.INTERACTIVE
+
+    @property
+    def time_to_first_track(self) -> Optional[float]:
+        """Seconds from submission until the first song was ready"""
+        if self.first_track_at is None:
+            return None
+        return self.first_track_at - self.submitted_at
+
+    @property
+    def queue_time(self) -> Optional[float]:
+        """Seconds the job waited for a worker slot"""
+        if self.started_at is None:
+            return None
+        return self.started_at - self.submitted_at
+
+    def mark_first_track(self, name: str = None):
+        """Record when the first song finished (track_callback for the downloader)"""
+        if self.first_track_at is None:
+            self.first_track_at = time.monotonic()
+
+    def cancel(self):
+        """Cancel the job, killing its spotdl process if it is running"""
+        self.token.cancel()
+
+
+class JobScheduler:
+    """
+    Runs download jobs on a fixed number of worker threads
+
+    Jobs are taken in priority order. Some worker slots are reserved for
+    interactive jobs, so a single track pasted while a large playlist is
+    downloading starts immediately instead of waiting behind it.
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[DownloadJob], None],
+        max_workers: int = 2,
+        reserved_interactive: int = 1
+    ):
+        """
+        Args:
+            run_job: Function that performs a job; it should check job.token
+            max_workers: Total number of jobs that may run at once
+            reserved_interactive: Slots that bulk jobs may never occupy
+        """
+        if reserved_interactive >= max_workers:
+            raise ValueError("At least one worker slot must be available to bulk jobs")
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.bulk_slots = max_workers - reserved_interactive
+        self._queue = []
+        self._sequence = itertools.count()
+        self._running: List[DownloadJob] = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._workers = []
+
+    def submit(
+        self,
+        url: str,
+        priority: Optional[int] = None,
+        options: Optional[dict] = None
+    ) -> DownloadJob:
+        """
+        Queue a job, classifying it by URL unless a priority is given
+
+        Args:
+            url: Spotify URL to download
+            priority: Explicit JobPriority; classified from the URL if None
+            options: Settings captured at submission, available to run_job
+                as job.options
+
+        Returns:
+            The queued job
+        """
+        job = DownloadJob(url, classify_url(url) if priority is None else priority, options)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down")
+            heapq.heappush(self._queue, (job.priority, next(self._sequence), job))
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._worker, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify_all()
+        return job
+
+    @property
+    def active_jobs(self) -> List[DownloadJob]:
+        """Queued and running jobs"""
+        with self._condition:
+            return list(self._running) + [entry[2] for entry in self._queue]
+
+    def cancel_all(self):
+        """Cancel every queued and running job"""
+        for job in self.active_jobs:
+            job.cancel()
+        with self._condition:
+            self._condition.notify_all()
+
+    def shutdown(self):
+        """Cancel all jobs and stop the workers"""
+        with self._condition:
+            self._shutdown = True
+        self.cancel_all()
+
+    def _next_job(self) -> Optional[DownloadJob]:
+        """Wait for a job this worker may run; None on shutdown"""
+        with self._condition:
+            while True:
+                if self._shutdown:
+                    return None
+                # Drop cancelled jobs that never started
+                while self._queue and self._queue[0][2].token.cancelled:
+                    job = heapq.heappop(self._queue)[2]
+                    job.state = JobState.CANCELLED
+                    job.finished_at = time.monotonic()
+
+                if self._queue:
+                    job = self._queue[0][2]
+                    running_bulk = sum(1 for j in self._running if not j.is_interactive)
+                    if job.is_interactive or running_bulk < self.bulk_slots:
+                        heapq.heappop(self._queue)
+                        job.state = JobState.RUNNING
+                        job.started_at = time.monotonic()
+                        self._running.append(job)
+                        return job
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                self.run_job(job)
+                job.state = JobState.CANCELLED if job.token.cancelled else JobState.DONE
+            except DownloadCancelled:
+                job.state = JobState.CANCELLED
+            except Exception as e:
+                job.error = str(e)
+                job.state = JobState.FAILED
+            finally:
+                job.finished_at = time.monotonic()
+                with self._condition:
+                    self._running.remove(job)
+                    self._condition.notify_all()
@@ -7,23 +7,93 @@ import json
 import os
 import sys
 import asyncio
+import re
+import shutil
+import signal
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import List, Callable, Optional
+from typing import Dict, List, Callable, Optional
+
+from mutagen import MutagenError
+from mutagen.id3 import ID3
+
+from downloader.cancellation import CancellationToken, DownloadCancelled
+from downloader.diskio import usage_bytes_written
+from downloader.track import Track, TrackState
+from profiling.profiler import active_session, profiled
+
+
+# Extensions treated as music files (exclude cache and other non-music files)
+MUSIC_EXTENSIONS = {'.mp3', '.m4a', '.flac', '.wav', '.ogg', '.opus'}
+
+# spotdl prints one of these per song once its file is in place
+TRACK_DONE_PATTERN = re.compile(r'^(?:Downloaded|Skipping) "(.+?)"')
+
+# Seconds to wait after SIGTERM before the process group is killed
+TERMINATE_GRACE_PERIOD = 0.05
+
+# Optional staging location (e.g. a RAM disk) for in-progress downloads
+STAGING_ENV = 'SPOTIFY_DOWNLOADER_STAGING'
+
+# Song URL to file name index of everything published to an output directory
+ARCHIVE_INDEX = '.archive.json'
+
+
+def find_ffmpeg() -> str:
+    """Locate ffmpeg, preferring the copy bundled with the app"""
+    if getattr(sys, 'frozen', False):
+        bundled = Path(sys.executable).parent.parent / 'Resources' / 'bin' / 'ffmpeg'
+        if bundled.exists():
+            return str(bundled)
+    found = shutil.which('ffmpeg')
+    if found:
+        return found
+    for candidate in ['/opt/homebrew/bin/ffmpeg', '/usr/local/bin/ffmpeg', '/usr/bin/ffmpeg']:
+        if os.path.exists(candidate):
+            return candidate
+    return 'ffmpeg'
+
+
+def _normalize_name(name: str) -> str:
+    """Reduce a song or file name to lowercase alphanumerics for matching"""
+    return re.sub(r'[^0-9a-z]+', '', name.lower())
 
 
 class SpotifyDownloader:
     """Handles downloading songs from Spotify using spotdl"""
     
-    def __init__(self, output_dir: Path):
+    def __init__(self, output_dir: Path, staging_root: Optional[Path] = None):
+        """
+        Args:
+            output_dir: Where finished songs are published
+            staging_root: Where per-job staging directories are created;
+                defaults to $SPOTIFY_DOWNLOADER_STAGING or output_dir/.staging
+        """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        if staging_root is None:
+            staging_root = os.environ.get(STAGING_ENV) or self.output_dir / '.staging'
+        self.staging_root = Path(staging_root)
+        self.staging_root.mkdir(parents=True, exist_ok=True)
+        # Publishing is a rename only when staging shares the output filesystem
+        self.staging_same_device = os.stat(self.staging_root).st_dev == os.stat(self.output_dir).st_dev
+        # Concurrent jobs share the output directory's archive index
+        self._index_lock = threading.Lock()
     
+    @profiled('download')
     def download(
         self,
         url: str,
         progress_callback: Optional[Callable[[int, int, str], None]] = None,
-        overwrite: bool = False
-    ) -> List[Path]:
+        overwrite: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+        track_callback: Optional[Callable[[str], None]] = None,
+        archive: Optional[Path] = None,
+        publish_callback: Optional[Callable[[Track], None]] = None,
+        latest_if_none: bool = True
+    ) -> List[Track]:
         """
         Download songs from a Spotify URL
         
@@ -31,135 +101,153 @@ class SpotifyDownloader:
             url: Spotify URL (song, album, or playlist)
             progress_callback: Optional callback function(current, total, message)
             overwrite: If True, re-download even if file exists
+            cancel_token: Optional token; cancelling it kills spotdl immediately
+            track_callback: Optional callback function(name) called as each song finishes
+            archive: Optional spotdl archive file; songs listed in it are skipped
+                and only newly downloaded files are returned
+            publish_callback: Optional callback function(track) called as each
+                file is published, before the Spotify metadata is filled in
+            latest_if_none: If nothing new was downloaded (and no archive is
+                used), return the most recently modified existing song instead;
+                retries of one specific song should turn this off
+        
+        Songs are downloaded, transcoded and tagged in a private staging
+        directory and each one is published to the output directory, with
+        an atomic rename, as soon as spotdl reports it finished. Other jobs
+        never see partially written files.
         
         Returns:
-            List of downloaded file paths
+            List of downloaded tracks (most recent first)
+        
+        Raises:
+            DownloadCancelled: If cancel_token was cancelled
         """
         downloaded_files = []
+        queued_at = time.time()
+        staging_dir = Path(tempfile.mkdtemp(prefix='job-', dir=self.staging_root))
+        
+        def publish(track):
+            downloaded_files.append(track)
+            if publish_callback:
+                publish_callback(track)
+        
+        def on_song_done(name):
+            track = self._publish_song(staging_dir, name, queued_at)
+            if track is not None:
+                publish(track)
+            if track_callback:
+                track_callback(name)
+        
+        # spotdl writes the resolved song metadata (ID, duration) here
+        save_file = str(staging_dir / '.songs.spotdl')
         
         try:
             # First, get the list of songs
             if progress_callback:
                 progress_callback(0, 1, "Fetching song information...")
             
-            # Get list of existing files before download
-            existing_files = set(self.output_dir.glob("*.*"))
-            
-            # Use our wrapper script that sets up asyncio event loop properly
-            # Find the wrapper script - it's bundled in Resources directory
-            if getattr(sys, 'frozen', False):
-                # Running in a bundle
-                bundle_dir = Path(sys.executable).parent.parent / 'Resources'
-                wrapper_script = bundle_dir / 'run_spotdl.py'
-            else:
-                # Running in development
-                wrapper_script = Path(__file__).parent.parent / 'run_spotdl.py'
+            # Staging starts out empty, so spotdl is told which songs are
+            # already in the output directory instead
+            skip_archive = archive
+            if archive is None and not overwrite:
+                skip_archive = staging_dir / '.archive'
+                self._write_skip_archive(skip_archive)
             
             cmd = [
                 sys.executable,
-                str(wrapper_script),
+                str(self._wrapper_script()),
                 url,
-                '--output', str(self.output_dir),
+                '--output', str(staging_dir),
                 '--output-format', 'mp3',
-                '--download-threads', '4'
+                '--download-threads', '4',
+                '--save-file', save_file
             ]
+            if skip_archive is not None:
+                cmd.extend(['--archive', str(skip_archive)])
             
-            # If overwrite is requested, delete existing files that match this URL
-            # This is a workaround since spotdl doesn't have an overwrite flag
+            # Have the spotdl child process profile itself into the same bundle
+            profile_session = active_session()
+            if profile_session is not None:
+                cmd.extend([
+                    '--profile-output',
+                    str(profile_session.child_profile_path('spotdl'))
+                ])
+            
+            # Without the archive spotdl downloads every song again, and
+            # publishing replaces the existing files
             if overwrite and progress_callback:
                 progress_callback(0, 1, "Checking for existing files to overwrite...")
             
             if progress_callback:
                 progress_callback(0, 1, f"Running: {' '.join(cmd)}")
             
-            # Create a clean environment that uses system paths
-            # This ensures spotdl uses system Python, not the bundled app's Python
-            env = os.environ.copy()
-            # Make sure we use the system PATH
-            if 'PATH' not in env:
-                env['PATH'] = '/usr/local/bin:/usr/bin:/bin:/usr/sbin:/sbin'
-            # Set UTF-8 encoding to handle unicode characters
-            env['PYTHONIOENCODING'] = 'utf-8'
-            env['LC_ALL'] = 'en_US.UTF-8'
-            env['LANG'] = 'en_US.UTF-8'
-            
-            # Run the download process
-            # Use subprocess.run with text output to capture everything at once
-            result = subprocess.run(
+            env = self._spotdl_env()
+            
+            # Run the download process, streaming its output so progress is
+            # live and the process can be killed as soon as the job is cancelled
+            returncode, output, spotdl_bytes = self._run_spotdl(
                 cmd,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace',  # Replace problematic characters instead of failing
-                cwd=str(self.output_dir),
-                env=env,
-                shell=False
+                env,
+                progress_callback,
+                on_song_done,
+                cancel_token,
+                staging_dir
             )
             
-            # Log the output
-            if progress_callback:
-                for line in result.stdout.splitlines():
-                    if line.strip():
-                        progress_callback(0, 1, line.strip())
-                
-                # Also log stderr if there's any
-                for line in result.stderr.splitlines():
-                    if line.strip():
-                        progress_callback(0, 1, line.strip())
+            # Partial files only ever exist in staging, removed below
+            if cancel_token is not None and cancel_token.cancelled:
+                raise DownloadCancelled("Download was cancelled")
             
-            if result.returncode != 0:
+            if returncode != 0:
                 # Check if it's a module not found error
-                if "No module named" in result.stderr or "No module named" in result.stdout:
+                if "No module named" in output:
                     raise ModuleNotFoundError(
                         "spotdl module is not available. This is a bundling issue.\n"
                         "Please report this error to the developer."
                     )
                 # Check if it's because files were already downloaded
-                elif "already downloaded" in result.stderr.lower() or "already downloaded" in result.stdout.lower():
+                elif "already downloaded" in output.lower():
                     if progress_callback:
                         progress_callback(0, 1, "Files already exist, checking for existing downloads...")
                     # Don't raise an error, just continue to find the files
                 else:
                     # Provide more detailed error message
-                    error_msg = f"spotdl exited with code {result.returncode}"
-                    if result.stderr:
-                        error_msg += f"\nError output: {result.stderr}"
+                    error_msg = f"spotdl exited with code {returncode}"
+                    if output:
+                        error_msg += f"\nError output: {output}"
                     raise Exception(error_msg)
             
-            # Find newly downloaded files
-            # Get all files after download
-            current_files = set(self.output_dir.glob("*.*"))
-            new_files = current_files - existing_files
-            
-            # Filter to only include music files (exclude cache and other non-music files)
-            music_extensions = {'.mp3', '.m4a', '.flac', '.wav', '.ogg', '.opus'}
-            
-            # If we found new files, filter them
-            if new_files:
-                downloaded_files = [
-                    f for f in new_files 
-                    if f.suffix.lower() in music_extensions and not f.name.startswith('.')
-                ]
-            
-            # If no new files or empty list, look for existing music files
-            if not downloaded_files:
-                # Look for all music files in the directory (sorted by most recent)
-                all_music_files = []
-                for ext in music_extensions:
-                    for file_path in self.output_dir.glob(f"*{ext}"):
-                        if not file_path.name.startswith('.'):
-                            all_music_files.append(file_path)
-                
-                # Sort by modification time and take the most recent one(s)
-                all_music_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-                
-                # If we have files, take the most recent one (likely what was just checked)
-                if all_music_files:
-                    downloaded_files = [all_music_files[0]]
+            # Publish whatever spotdl finished without announcing it, with a
+            # single staging scan; the stat results are kept on the tracks so
+            # nothing downstream has to touch the filesystem again
+            for path, st in self._scan_music_files(staging_dir):
+                publish(self._publish_file(path, st, queued_at))
+            
+            # spotdl's writes (download, transcode, tagging) are only known
+            # for the whole job, so each new song gets an equal share. Where
+            # they cannot be measured, each song counts as written once.
+            for track in downloaded_files:
+                if spotdl_bytes is None:
+                    track.bytes_written += track.size
+                else:
+                    track.bytes_written += spotdl_bytes // len(downloaded_files)
+            published = list(downloaded_files)
+            
+            # If no new files, take the most recent one (likely what was just checked)
+            if not downloaded_files and archive is None and latest_if_none:
+                music_files = self._scan_music_files(self.output_dir)
+                if music_files:
+                    path, st = max(music_files, key=lambda item: item[1].st_mtime)
+                    publish(self._make_track(path, st, queued_at))
             
             # Sort by modification time (most recent first)
-            if downloaded_files:
-                downloaded_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
+            downloaded_files.sort(key=lambda track: track.downloaded_at, reverse=True)
+            
+            songs = self._load_song_metadata(save_file)
+            for track in downloaded_files:
+                self._apply_song_metadata(track, songs)
+            if archive is None:
+                self._record_downloads(published)
             
             if progress_callback:
                 progress_callback(
@@ -170,6 +258,8 @@ class SpotifyDownloader:
             
             return downloaded_files
         
+        except DownloadCancelled:
+            raise
         except FileNotFoundError:
             raise Exception(
                 "spotdl not found! Please install it with: pip install spotdl\n"
@@ -177,6 +267,340 @@ class SpotifyDownloader:
             )
         except Exception as e:
             raise Exception(f"Download failed: {str(e)}")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    def _write_skip_archive(self, path: Path):
+        """
+        Write a spotdl archive of the songs still in the output directory
+        
+        Songs that have been removed since (e.g. imported into Apple Music)
+        are left out, so they are downloaded again.
+        """
+        with self._index_lock:
+            index = self._load_index()
+        existing = set(os.listdir(self.output_dir))
+        with open(path, 'w', encoding='utf-8') as f:
+            for url, name in index.items():
+                if name in existing:
+                    f.write(f"{url}\n")
+    
+    def _record_downloads(self, tracks: List[Track]):
+        """Add published tracks to the archive index, dropping removed songs"""
+        entries = {track.url: track.path.name for track in tracks if track.url}
+        if not entries:
+            return
+        with self._index_lock:
+            existing = set(os.listdir(self.output_dir))
+            index = {
+                url: name for url, name in self._load_index().items()
+                if name in existing
+            }
+            index.update(entries)
+            self._save_index(index)
+    
+    def _load_index(self) -> Dict[str, str]:
+        """
+        Load the output directory's archive index (call with _index_lock held)
+        
+        If there is none yet, it is built once from the source URL spotdl
+        tags every song with, so songs downloaded before the index existed
+        are still skipped.
+        """
+        try:
+            with open(self.output_dir / ARCHIVE_INDEX, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if isinstance(index, dict):
+                return index
+        except (OSError, ValueError):
+            pass
+        
+        index = {}
+        for path, _ in self._scan_music_files(self.output_dir):
+            try:
+                sources = ID3(path).getall('WOAS')
+            except (MutagenError, OSError, ValueError):
+                continue
+            if sources:
+                index[sources[0].url] = path.name
+        self._save_index(index)
+        return index
+    
+    def _save_index(self, index: Dict[str, str]):
+        """Replace the archive index atomically"""
+        fd, temporary = tempfile.mkstemp(prefix=f"{ARCHIVE_INDEX}.", dir=self.output_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(temporary, self.output_dir / ARCHIVE_INDEX)
+        except BaseException:
+            os.remove(temporary)
+            raise
+    
+    def _publish_song(
+        self,
+        staging_dir: Path,
+        name: str,
+        queued_at: float
+    ) -> Optional[Track]:
+        """
+        Publish the file for a song spotdl just reported as finished
+        
+        spotdl names files after the song, so the file is looked up directly
+        instead of scanning staging. Songs whose file name differs are left
+        for the final scan.
+        
+        Returns:
+            The published track, or None if there was nothing to publish
+        """
+        for extension in MUSIC_EXTENSIONS:
+            path = staging_dir / f"{name}{extension}"
+            try:
+                st = os.stat(path)
+            except (OSError, ValueError):
+                continue
+            return self._publish_file(path, st, queued_at)
+        return None
+    
+    def _publish_file(self, path: Path, st: os.stat_result, queued_at: float) -> Track:
+        """
+        Move one finished song from staging into the output directory
+        
+        A rename on the same filesystem writes no data. Otherwise the file is
+        copied to a hidden temporary name and then renamed, so it still
+        appears atomically.
+        
+        Returns:
+            Track for the published file
+        """
+        destination = self.output_dir / path.name
+        if self.staging_same_device:
+            os.replace(path, destination)
+            publish_bytes = 0
+        else:
+            temporary = self.output_dir / f".{path.name}.publishing"
+            shutil.copyfile(path, temporary)
+            os.replace(temporary, destination)
+            os.remove(path)
+            publish_bytes = st.st_size
+        return self._make_track(destination, st, queued_at, publish_bytes)
+    
+    def _wrapper_script(self) -> Path:
+        """Locate run_spotdl.py"""
+        # Use our wrapper script that sets up asyncio event loop properly
+        # Find the wrapper script - it's bundled in Resources directory
+        if getattr(sys, 'frozen', False):
+            # Running in a bundle
+            bundle_dir = Path(sys.executable).parent.parent / 'Resources'
+            wrapper_script = bundle_dir / 'run_spotdl.py'
+        else:
+            # Running in development
+            wrapper_script = Path(__file__).parent.parent / 'run_spotdl.py'
+        return wrapper_script
+    
+    def _spotdl_env(self) -> Dict[str, str]:
+        """Environment for the spotdl child process"""
+        # Create a clean environment that uses system paths
+        # This ensures spotdl uses system Python, not the bundled app's Python
+        env = os.environ.copy()
+        # Make sure we use the system PATH
+        if 'PATH' not in env:
+            env['PATH'] = '/usr/local/bin:/usr/bin:/bin:/usr/sbin:/sbin'
+        # Set UTF-8 encoding to handle unicode characters
+        env['PYTHONIOENCODING'] = 'utf-8'
+        env['LC_ALL'] = 'en_US.UTF-8'
+        env['LANG'] = 'en_US.UTF-8'
+        return env
+    
+    def list_songs(self, url: str) -> List[dict]:
+        """
+        Resolve a Spotify URL to its songs without downloading anything
+        
+        Args:
+            url: Spotify URL (song, album, or playlist)
+        
+        Returns:
+            List of spotdl song dictionaries (song_id, name, artists, duration, url)
+        """
+        save_fd, save_file = tempfile.mkstemp(suffix='.spotdl')
+        os.close(save_fd)
+        try:
+            result = subprocess.run(
+                [sys.executable, str(self._wrapper_script()), 'save', url, '--save-file', save_file],
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                cwd=str(self.output_dir),
+                env=self._spotdl_env(),
+                shell=False
+            )
+            if result.returncode != 0:
+                raise Exception(f"spotdl exited with code {result.returncode}\nError output: {result.stderr}")
+            with open(save_file, 'r', encoding='utf-8') as f:
+                songs = json.load(f)
+            return songs if isinstance(songs, list) else []
+        finally:
+            try:
+                os.remove(save_file)
+            except OSError:
+                pass
+    
+    def _run_spotdl(
+        self,
+        cmd: List[str],
+        env: Dict[str, str],
+        progress_callback: Optional[Callable[[int, int, str], None]],
+        track_callback: Optional[Callable[[str], None]],
+        cancel_token: Optional[CancellationToken],
+        cwd: Path
+    ) -> tuple:
+        """
+        Run spotdl in its own process group, forwarding output line by line
+        
+        Returns:
+            Tuple of (return code, combined stdout/stderr output, bytes that
+            spotdl and the processes it ran wrote to storage, or None where
+            the kernel does not report them)
+        """
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='replace',  # Replace problematic characters instead of failing
+            cwd=str(cwd),
+            env=env,
+            shell=False,
+            start_new_session=True
+        )
+        
+        def kill():
+            self._kill_process_group(process)
+        
+        if cancel_token is not None:
+            cancel_token.register(kill)
+        
+        lines = []
+        written = 0
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if not line:
+                    continue
+                lines.append(line)
+                if progress_callback:
+                    progress_callback(0, 1, line)
+                match = TRACK_DONE_PATTERN.match(line)
+                if match and track_callback:
+                    track_callback(match.group(1))
+            returncode, written = self._wait_with_usage(process)
+        finally:
+            if cancel_token is not None:
+                cancel_token.unregister(kill)
+            process.stdout.close()
+            if process.poll() is None:
+                self._kill_process_group(process)
+        
+        return returncode, '\n'.join(lines), written
+    
+    def _wait_with_usage(self, process: subprocess.Popen) -> tuple:
+        """
+        Reap spotdl, reading the kernel's I/O counters for it
+        
+        The usage os.wait4 returns includes every child spotdl waited for
+        (ffmpeg, yt-dlp), and belongs to this job alone even when other
+        jobs run at the same time.
+        
+        Returns:
+            Tuple of (return code, bytes written to storage or None)
+        """
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # Already reaped by a kill on another thread
+            return process.wait(), 0
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode, usage_bytes_written(usage)
+    
+    def _kill_process_group(self, process: subprocess.Popen):
+        """Terminate spotdl and everything it spawned (ffmpeg, yt-dlp)"""
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=TERMINATE_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        except ProcessLookupError:
+            pass
+    
+    def _scan_music_files(self, directory: Path) -> List[tuple]:
+        """Return (path, stat) pairs for every music file in a directory"""
+        music_files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in MUSIC_EXTENSIONS:
+                    continue
+                if entry.is_file():
+                    music_files.append((Path(entry.path), entry.stat()))
+        return music_files
+    
+    def _load_song_metadata(self, save_file: str) -> Dict[str, dict]:
+        """
+        Load the song list spotdl wrote to the save file
+        
+        Returns:
+            Dictionary mapping normalized "artists - title" names to song data
+        """
+        try:
+            with open(save_file, 'r', encoding='utf-8') as f:
+                songs = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        
+        metadata = {}
+        for song in songs if isinstance(songs, list) else []:
+            name = song.get('name') or ''
+            artists = ', '.join(song.get('artists') or [])
+            metadata[_normalize_name(f"{artists} - {name}")] = song
+            metadata.setdefault(_normalize_name(name), song)
+        return metadata
+    
+    def _make_track(
+        self,
+        path: Path,
+        st: os.stat_result,
+        queued_at: float,
+        publish_bytes: int = 0
+    ) -> Track:
+        """Build a Track from a scanned file"""
+        track = Track(
+            path,
+            size=st.st_size,
+            state=TrackState.DOWNLOADED,
+            queued_at=queued_at,
+            downloaded_at=st.st_mtime,
+        )
+        # Only the publish copy so far; download() adds spotdl's share
+        track.bytes_written = publish_bytes
+        return track
+    
+    def _apply_song_metadata(self, track: Track, songs: Dict[str, dict]):
+        """Fill in the Spotify ID, title and duration from spotdl's metadata"""
+        stem = track.path.stem
+        song = songs.get(_normalize_name(stem))
+        if song is None and ' - ' in stem:
+            song = songs.get(_normalize_name(stem.split(' - ', 1)[1]))
+        if song is None:
+            return
+        track.spotify_id = song.get('song_id')
+        track.title = song.get('name')
+        track.duration = song.get('duration')
     
     def check_dependencies(self) -> bool:
         """Check if required dependencies are installed"""
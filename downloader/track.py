@@ -0,0 +1,110 @@
+"""
+Track result model shared by the downloader, importer and GUI
+"""
+
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class TrackState:
+    """Lifecycle states a track moves through"""
+
+    PENDING = "pending"
+    DOWNLOADED = "downloaded"
+    VERIFIED = "verified"
+    IMPORTING = "importing"
+    IMPORTED = "imported"
+    FAILED = "failed"
+
+
+class Track:
+    """
+    Result record for a single downloaded song
+
+    Uses __slots__ so that large playlists (10k+ tracks) keep a small,
+    flat memory footprint. Size and timestamps are captured once when the
+    download finishes so later stages never need to stat the file again.
+    """
+
+    __slots__ = (
+        'spotify_id',
+        'title',
+        'path',
+        'size',
+        'bytes_written',
+        'duration',
+        'checksum',
+        'loudness',
+        'gain',
+        'state',
+        'queued_at',
+        'downloaded_at',
+        'imported_at',
+        'error',
+    )
+
+    def __init__(
+        self,
+        path: Path,
+        spotify_id: Optional[str] = None,
+        title: Optional[str] = None,
+        size: int = 0,
+        duration: Optional[float] = None,
+        state: str = TrackState.PENDING,
+        queued_at: Optional[float] = None,
+        downloaded_at: Optional[float] = None,
+    ):
+        self.path = Path(path)
+        self.spotify_id = spotify_id
+        self.title = title
+        self.size = size
+        self.bytes_written = size
+        self.duration = duration
+        self.checksum = None
+        self.loudness = None
+        self.gain = None
+        self.state = state
+        self.queued_at = queued_at if queued_at is not None else time.time()
+        self.downloaded_at = downloaded_at
+        self.imported_at = None
+        self.error = None
+
+    @property
+    def url(self) -> Optional[str]:
+        """Spotify URL of the track, if its ID is known"""
+        if self.spotify_id:
+            return f"https://open.spotify.com/track/{self.spotify_id}"
+        return None
+
+    @property
+    def name(self) -> str:
+        """File name of the track"""
+        return self.path.name
+
+    @property
+    def display_name(self) -> str:
+        """Human readable name, preferring Spotify metadata over the file name"""
+        return self.title or self.path.name
+
+    def mark(self, state: str, error: Optional[str] = None):
+        """
+        Move the track to a new state, stamping the matching timestamp
+
+        Args:
+            state: One of the TrackState values
+            error: Optional error message when the state is FAILED
+        """
+        self.state = state
+        if state == TrackState.DOWNLOADED and self.downloaded_at is None:
+            self.downloaded_at = time.time()
+        elif state == TrackState.IMPORTED:
+            self.imported_at = time.time()
+        if error is not None:
+            self.error = error
+
+    def __repr__(self) -> str:
+        return (
+            f"Track(spotify_id={self.spotify_id!r}, path={str(self.path)!r}, "
+            f"state={self.state!r}, size={self.size}, duration={self.duration})"
+        )
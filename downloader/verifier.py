@@ -0,0 +1,242 @@
+"""
+Post-download integrity verification using mutagen
+
+Tracks are submitted to a VerificationPipeline as soon as the downloader
+publishes them, so files are checked in a process pool while spotdl is
+still working on the rest of the playlist.
+"""
+
+import hashlib
+import mmap
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from mutagen import File as MutagenFile, MutagenError
+
+from downloader.cancellation import CancellationToken, DownloadCancelled, wait_for_result
+from downloader.track import Track, TrackState
+from profiling.profiler import profiled
+
+
+# Allowed difference between the decoded and the Spotify duration
+DURATION_TOLERANCE_RATIO = 0.1
+DURATION_TOLERANCE_SECONDS = 10.0
+
+# Files smaller than this fraction of bitrate * duration are treated as truncated
+TRUNCATION_RATIO = 0.9
+
+# Bytes hashed per step when streaming through the memory map
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_file(path: str) -> Tuple[str, int]:
+    """Stream a SHA-256 of the file through a read-only memory map"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest(), 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return digest.hexdigest(), size
+
+
+def _duration_error(length: float, expected_duration: Optional[float]) -> Optional[str]:
+    """Compare a decoded duration with the one Spotify reported"""
+    if not expected_duration:
+        return None
+    tolerance = max(DURATION_TOLERANCE_SECONDS, expected_duration * DURATION_TOLERANCE_RATIO)
+    if abs(length - expected_duration) > tolerance:
+        return f"Duration {length:.0f}s does not match expected {expected_duration:.0f}s"
+    return None
+
+
+def verify_file(
+    path: str,
+    checksum: bool = False,
+    expected_duration: Optional[float] = None
+) -> Tuple[Optional[str], Optional[str], Optional[float]]:
+    """
+    Check that a file has valid audio frames and is not truncated
+
+    Runs in a worker process, so it only takes and returns picklable values.
+    The pipeline compares the duration with Spotify's in the parent process,
+    because the song metadata is only known once spotdl has finished; callers
+    that already know it can pass expected_duration instead.
+
+    Args:
+        path: Path to the audio file
+        checksum: Also stream a SHA-256 of the file (an extra full read)
+        expected_duration: Spotify's duration in seconds, checked if given
+
+    Returns:
+        Tuple of (error message or None, SHA-256 checksum or None, decoded duration)
+    """
+    try:
+        audio = MutagenFile(path)
+    except (MutagenError, OSError) as e:
+        return f"Unreadable audio: {e}", None, None
+
+    if audio is None or getattr(audio, 'info', None) is None:
+        return "Unrecognized audio format", None, None
+
+    length = getattr(audio.info, 'length', 0) or 0
+    if length <= 0:
+        return "No audio frames found", None, None
+
+    if checksum:
+        digest, size = _hash_file(path)
+    else:
+        digest, size = None, os.path.getsize(path)
+
+    # VBR headers report the full length even when the file was cut short,
+    # so compare the size against what the declared bitrate implies
+    bitrate = getattr(audio.info, 'bitrate', 0) or 0
+    if bitrate and size < (bitrate / 8) * length * TRUNCATION_RATIO:
+        return "File is truncated", digest, length
+
+    return _duration_error(length, expected_duration), digest, length
+
+
+class VerificationPipeline:
+    """
+    Verifies tracks in a process pool as they are submitted
+
+    Use as a context manager: submit() tracks while the download runs, then
+    call finish() to collect the results once the downloader has filled in
+    the Spotify metadata. Cancelling the token stops waiting immediately and
+    drops every file that has not started verifying.
+    """
+
+    def __init__(self, verifier: 'TrackVerifier', cancel_token: Optional[CancellationToken] = None):
+        self.verifier = verifier
+        self.cancel_token = cancel_token
+        self._executor = None
+        self._pending: List[Tuple[Track, Future]] = []
+
+    def submit(self, track: Track):
+        """Start verifying a track (publish_callback for the downloader)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.verifier.max_workers)
+        future = self._executor.submit(verify_file, str(track.path), self.verifier.checksums)
+        self._pending.append((track, future))
+
+    @profiled('verify')
+    def finish(self, progress_callback: Optional[Callable[[int, int, str], None]] = None) -> List[Track]:
+        """
+        Apply the results to the submitted tracks, quarantining bad files
+
+        Verified tracks get their state (and checksum, if enabled) updated.
+        Failed tracks are marked FAILED with an error and their path points
+        at the quarantined file.
+
+        Args:
+            progress_callback: Optional callback function(current, total, message)
+
+        Returns:
+            List of tracks that failed verification
+
+        Raises:
+            DownloadCancelled: If the cancel token was cancelled
+        """
+        pending, self._pending = self._pending, []
+        failed = []
+        for i, (track, future) in enumerate(pending):
+            try:
+                error, checksum, duration = wait_for_result(future, self.cancel_token)
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                error, checksum, duration = f"Verification failed: {e}", None, None
+
+            if error is None:
+                error = _duration_error(duration, track.duration)
+            track.checksum = checksum
+            if error is None:
+                if track.duration is None:
+                    track.duration = duration
+                track.mark(TrackState.VERIFIED)
+                message = f"Verified: {track.name}"
+            else:
+                self.verifier._quarantine(track, error)
+                failed.append(track)
+                message = f"Quarantined {track.name}: {error}"
+
+            if progress_callback:
+                progress_callback(i + 1, len(pending), message)
+
+        return failed
+
+    def close(self):
+        """Stop the worker processes, without waiting if the job was cancelled"""
+        if self._executor is not None:
+            cancelled = self.cancel_token is not None and self.cancel_token.cancelled
+            self._executor.shutdown(wait=not cancelled, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> 'VerificationPipeline':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrackVerifier:
+    """Verifies downloaded tracks in a process pool and quarantines bad files"""
+
+    def __init__(self, quarantine_dir: Path, max_workers: Optional[int] = None, checksums: bool = False):
+        """
+        Args:
+            quarantine_dir: Where files that fail verification are moved
+            max_workers: Worker processes; defaults to the number of CPUs
+            checksums: Record a SHA-256 on every track, for callers that use it
+        """
+        self.quarantine_dir = Path(quarantine_dir)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.checksums = checksums
+
+    def pipeline(self, cancel_token: Optional[CancellationToken] = None) -> VerificationPipeline:
+        """Start a pipeline that verifies tracks while they are still downloading"""
+        return VerificationPipeline(self, cancel_token)
+
+    def verify(
+        self,
+        tracks: List[Track],
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        cancel_token: Optional[CancellationToken] = None
+    ) -> List[Track]:
+        """
+        Verify tracks in place, moving failed files into quarantine
+
+        Args:
+            tracks: Tracks produced by SpotifyDownloader.download
+            progress_callback: Optional callback function(current, total, message)
+            cancel_token: Optional token; cancelling it abandons the remaining files
+
+        Returns:
+            List of tracks that failed verification
+        """
+        if not tracks:
+            return []
+        with self.pipeline(cancel_token) as pipeline:
+            for track in tracks:
+                pipeline.submit(track)
+            return pipeline.finish(progress_callback)
+
+    def _quarantine(self, track: Track, error: str):
+        """Move a bad file out of the downloads folder so it gets re-downloaded"""
+        self.quarantine_dir.mkdir(parents=True, exist_ok=True)
+        destination = self.quarantine_dir / track.path.name
+        try:
+            os.replace(track.path, destination)
+            track.path = destination
+        except OSError as e:
+            error = f"{error} (could not quarantine: {e})"
+        track.mark(TrackState.FAILED, error)
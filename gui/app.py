@@ -4,13 +4,20 @@ Main GUI application window
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import threading
 import os
 import subprocess
+import threading
 import webbrowser
 from pathlib import Path
-from downloader.spotify_downloader import SpotifyDownloader
-from apple_music.importer import AppleMusicImporter
+from downloader.cancellation import DownloadCancelled
+from downloader.diskio import CHILD_BYTES_MEASURED
+from downloader.scheduler import JobScheduler
+from downloader.track import TrackState
+from profiling.profiler import ProfileSession, profile_dir_from_environment, profiled
+
+
+# How often the UI thread checks whether background startup has finished
+STARTUP_POLL_MS = 50
 
 
 class MusicDownloaderApp:
@@ -26,14 +33,83 @@ class MusicDownloaderApp:
         self.downloads_dir = Path.home() / "Music" / "Spotify Downloads"
         self.downloads_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize components
-        self.downloader = SpotifyDownloader(self.downloads_dir)
-        self.importer = AppleMusicImporter()
+        # The downloader, importer and dependency checks are loaded in the
+        # background so the window paints first; jobs wait for them
+        self.downloader = None
+        self.verifier = None
+        self.loudness_analyzer = None
+        self.importer = None
+        self.importer_error = None
+        self.load_error = None
+        self.environment = {}
+        self.components_ready = threading.Event()
+        
+        # Single tracks get a reserved slot so they never wait behind a
+        # playlist. cProfile cannot follow overlapping jobs, so profiled runs
+        # take one job at a time (single tracks still jump the queue).
+        if profile_dir_from_environment() is not None:
+            self.scheduler = JobScheduler(self._download_worker, max_workers=1, reserved_interactive=0)
+        else:
+            self.scheduler = JobScheduler(self._download_worker)
         
-        self.is_downloading = False
         self.logs_visible = False
         
+        # Finished jobs waiting for the summary dialog (UI thread only)
+        self._finished_jobs = []
+        
         self._setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        
+        threading.Thread(target=self._load_components, daemon=True).start()
+        self.root.after(STARTUP_POLL_MS, self._finish_startup)
+    
+    def _load_components(self):
+        """Import and construct the heavy subsystems off the UI thread"""
+        try:
+            # Downloads need both, so they are only published together
+            from gui.startup import check_environment
+            from downloader.spotify_downloader import SpotifyDownloader
+            from downloader.verifier import TrackVerifier
+            
+            self.environment = check_environment()
+            downloader = SpotifyDownloader(self.downloads_dir)
+            verifier = TrackVerifier(self.downloads_dir / ".quarantine")
+            self.downloader, self.verifier = downloader, verifier
+        except Exception as e:
+            self.load_error = str(e)
+            self.components_ready.set()
+            return
+        
+        try:
+            from apple_music.importer import AppleMusicImporter
+            self.importer = AppleMusicImporter()
+        except Exception as e:
+            self.importer_error = str(e)
+        finally:
+            self.components_ready.set()
+    
+    def _finish_startup(self):
+        """Apply background startup results on the UI thread"""
+        if not self.components_ready.is_set():
+            self.root.after(STARTUP_POLL_MS, self._finish_startup)
+            return
+        
+        if self.environment.get('numpy'):
+            self.loudness_checkbox.config(state='normal')
+        
+        problems = []
+        if self.load_error:
+            problems.append(f"Could not load the downloader: {self.load_error}")
+        if not self.environment.get('spotdl', True):
+            problems.append("spotdl not found! Please install it with: pip install spotdl")
+        if 'ffmpeg' in self.environment and not self.environment['ffmpeg']:
+            problems.append("FFmpeg not found! Install it with: brew install ffmpeg")
+        if self.importer_error:
+            problems.append(f"Apple Music import unavailable: {self.importer_error}")
+        
+        for problem in problems:
+            self.log(problem)
+        self.update_status(problems[0] if problems else "Ready")
     
     def _setup_ui(self):
         """Setup the user interface"""
@@ -73,6 +149,14 @@ class MusicDownloaderApp:
         )
         self.download_btn.grid(row=0, column=2)
         
+        self.cancel_btn = ttk.Button(
+            input_frame,
+            text="Cancel",
+            command=self.cancel_downloads,
+            state='disabled'
+        )
+        self.cancel_btn.grid(row=0, column=3, padx=(10, 0))
+        
         # Options Frame
         options_frame = ttk.LabelFrame(self.root, text="Options", padding=10)
         options_frame.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
@@ -93,6 +177,16 @@ class MusicDownloaderApp:
         )
         overwrite_checkbox.grid(row=1, column=0, sticky="w", pady=(5, 0))
         
+        self.normalize_loudness = tk.BooleanVar(value=False)
+        # Enabled once the background check confirms NumPy is installed
+        self.loudness_checkbox = ttk.Checkbutton(
+            options_frame,
+            text="Normalize loudness (ReplayGain / Sound Check tags)",
+            variable=self.normalize_loudness,
+            state='disabled'
+        )
+        self.loudness_checkbox.grid(row=2, column=0, sticky="w", pady=(5, 0))
+        
         # Progress Frame
         progress_frame = ttk.LabelFrame(self.root, text="Progress", padding=10)
         progress_frame.grid(row=3, column=0, padx=20, pady=10, sticky="nsew")
@@ -131,15 +225,35 @@ class MusicDownloaderApp:
         # Status bar
         self.status_label = tk.Label(
             self.root,
-            text="Ready",
+            text="Loading...",
             relief=tk.SUNKEN,
             anchor=tk.W,
             padx=5
         )
         self.status_label.grid(row=4, column=0, sticky="ew")
     
+    def _on_ui_thread(self, func, *args):
+        """
+        Run func on the Tk thread
+        
+        Download jobs run on scheduler threads and must not touch widgets
+        directly; their calls are queued onto the event loop instead.
+        """
+        if threading.current_thread() is threading.main_thread():
+            func(*args)
+            return
+        try:
+            self.root.after(0, func, *args)
+        except (tk.TclError, RuntimeError):
+            # The window has been closed; nothing is left to update
+            pass
+    
     def log(self, message):
         """Add a message to the log"""
+        self._on_ui_thread(self._append_log, message)
+    
+    def _append_log(self, message):
+        """Append a line to the log widget (UI thread only)"""
         self.log_text.configure(state='normal')
         self.log_text.insert(tk.END, message + "\n")
         self.log_text.see(tk.END)
@@ -147,12 +261,11 @@ class MusicDownloaderApp:
     
     def update_status(self, message):
         """Update the status bar"""
-        self.status_label.config(text=message)
+        self._on_ui_thread(lambda: self.status_label.config(text=message))
     
     def update_progress(self, value):
         """Update the progress bar"""
-        self.progress_var.set(value)
-        self.root.update_idletasks()
+        self._on_ui_thread(self.progress_var.set, value)
     
     def toggle_logs(self):
         """Toggle the visibility of the log text area"""
@@ -200,11 +313,7 @@ class MusicDownloaderApp:
                 messagebox.showerror("Error", f"Failed to open Spotify: {str(web_error)}")
     
     def start_download(self):
-        """Start the download process in a separate thread"""
-        if self.is_downloading:
-            messagebox.showwarning("In Progress", "A download is already in progress!")
-            return
-        
+        """Queue a download job with the scheduler"""
         url = self.url_entry.get().strip()
         if not url:
             messagebox.showerror("Error", "Please enter a Spotify URL!")
@@ -215,80 +324,266 @@ class MusicDownloaderApp:
             messagebox.showerror("Error", "Please enter a valid Spotify URL!")
             return
         
-        # Clear log
-        self.log_text.configure(state='normal')
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.configure(state='disabled')
-        
-        # Set initial progress
-        self.update_progress(5)
-        
-        # Disable download button
-        self.download_btn.config(state='disabled')
-        self.is_downloading = True
+        # Clear log when nothing else is running
+        if not self.scheduler.active_jobs:
+            self.log_text.configure(state='normal')
+            self.log_text.delete(1.0, tk.END)
+            self.log_text.configure(state='disabled')
+            
+            # Set initial progress
+            self.update_progress(5)
         
-        # Start download in a separate thread
-        thread = threading.Thread(target=self._download_worker, args=(url,))
-        thread.daemon = True
-        thread.start()
+        # Tk variables may only be read here, on the UI thread
+        job = self.scheduler.submit(url, options={
+            'overwrite': self.overwrite_existing.get(),
+            'normalize_loudness': self.normalize_loudness.get(),
+            'import_to_apple_music': self.import_to_apple_music.get(),
+        })
+        self.cancel_btn.config(state='normal')
+        self.url_entry.delete(0, tk.END)
+        if job.is_interactive:
+            self.log(f"Queued single track ahead of other downloads: {url}")
+        else:
+            self.log(f"Queued: {url}")
+    
+    def cancel_downloads(self):
+        """Cancel every queued and running download"""
+        self.scheduler.cancel_all()
+        self.update_status("Cancelling...")
+        self.log("\nCancelling downloads...")
+    
+    def _on_close(self):
+        """Stop running downloads before the window closes"""
+        self.scheduler.shutdown()
+        self.root.destroy()
     
-    def _download_worker(self, url):
+    def _download_worker(self, job):
+        """Scheduler entry point, profiling the whole job when enabled"""
+        profile_session = ProfileSession.start('job')
+        try:
+            self._process_download(job)
+        finally:
+            if profile_session is not None:
+                bundle_dir = profile_session.finish()
+                self.log(f"Profile written to: {bundle_dir}")
+    
+    @profiled('worker')
+    def _process_download(self, job):
         """Worker function to download and import music"""
+        url = job.url
+        options = job.options
+        result = None
         try:
+            if not self.components_ready.is_set():
+                self.update_status("Starting up...")
+                self.components_ready.wait()
+            if self.downloader is None:
+                raise Exception(f"Could not load the downloader: {self.load_error}")
+            
             self.update_status("Downloading...")
             self.update_progress(10)
             self.log(f"Starting download from: {url}")
             
-            # Download songs
-            downloaded_files = self.downloader.download(
-                url,
-                progress_callback=self._download_progress_callback,
-                overwrite=self.overwrite_existing.get()
-            )
-            
-            if not downloaded_files:
-                self.log("No files were downloaded!")
-                messagebox.showerror("Error", "No files were downloaded!")
-                return
+            # Files are verified as they are published, while the rest of
+            # the playlist is still downloading
+            with self.verifier.pipeline(job.token) as verification:
+                tracks = self.downloader.download(
+                    url,
+                    progress_callback=self._download_progress_callback,
+                    overwrite=options['overwrite'],
+                    cancel_token=job.token,
+                    track_callback=job.mark_first_track,
+                    publish_callback=verification.submit
+                )
+                job.tracks = tracks
+                if job.is_interactive and job.time_to_first_track is not None:
+                    self.log(f"Time to first track: {job.time_to_first_track:.1f}s")
+                
+                if not tracks:
+                    self.log("No files were downloaded!")
+                    result = ("Error", f"No files were downloaded from {url}")
+                    return
+                
+                self.log(f"\nSuccessfully downloaded {len(tracks)} file(s)")
+                for track in tracks:
+                    self.log(f"  {self._format_track(track)}")
+                written = sum(track.bytes_written for track in tracks) / (1024 * 1024)
+                self.log(f"Wrote {written:.1f} MB ({written / len(tracks):.1f} MB per track)")
+                if not CHILD_BYTES_MEASURED:
+                    self.log("  spotdl's writes are estimated from file sizes on this system")
+                
+                # Verify files before they reach Apple Music
+                self.update_status("Verifying downloads...")
+                tracks = self._verify_tracks(tracks, verification, job.token)
+            job.token.raise_if_cancelled()
             
-            self.log(f"\nSuccessfully downloaded {len(downloaded_files)} file(s)")
+            # Tag loudness before import so Music picks up the gain
+            if options['normalize_loudness']:
+                self.update_status("Analyzing loudness...")
+                self._analyze_loudness(tracks, job.token)
+                job.token.raise_if_cancelled()
             
             # Import to Apple Music if enabled
-            if self.import_to_apple_music.get():
+            if options['import_to_apple_music'] and self.importer is None:
+                self.log(f"\nSkipping Apple Music import: {self.importer_error}")
+            elif options['import_to_apple_music']:
                 self.update_status("Importing to Apple Music...")
                 self.log("\nImporting to Apple Music...")
                 
                 success_count = 0
-                for i, file_path in enumerate(downloaded_files):
+                for i, track in enumerate(tracks):
+                    job.token.raise_if_cancelled()
+                    if track.state != TrackState.VERIFIED:
+                        continue
                     try:
-                        self.log(f"Importing: {file_path.name}")
-                        self.importer.import_file(file_path)
-                        success_count += 1
+                        self.log(f"Importing: {track.display_name}")
+                        if self.importer.import_track(track):
+                            success_count += 1
+                        else:
+                            self.log(f"Failed to import {track.name}: {track.error}")
                         
                         # Update progress
-                        progress = 50 + (50 * (i + 1) / len(downloaded_files))
+                        progress = 50 + (50 * (i + 1) / len(tracks))
                         self.update_progress(progress)
                     except Exception as e:
-                        self.log(f"Failed to import {file_path.name}: {str(e)}")
+                        self.log(f"Failed to import {track.name}: {str(e)}")
                 
-                self.log(f"\nImported {success_count}/{len(downloaded_files)} file(s) to Apple Music")
+                self.log(f"\nImported {success_count}/{len(tracks)} file(s) to Apple Music")
             
             self.update_progress(100)
             self.update_status("Complete!")
-            messagebox.showinfo("Success", f"Successfully processed {len(downloaded_files)} song(s)!")
-            
-            # Clear the URL field after successful completion
-            self.url_entry.delete(0, tk.END)
+            result = ("Success", f"Successfully processed {len(tracks)} song(s)")
             
+        except DownloadCancelled:
+            self.log(f"\nCancelled: {url}")
+            self.update_status("Cancelled")
+            self.update_progress(0)
+            raise
+        
         except Exception as e:
             self.log(f"\nError: {str(e)}")
             self.update_status("Error!")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+            result = ("Error", f"An error occurred with {url}: {str(e)}")
         
         finally:
-            # Re-enable download button
-            self.download_btn.config(state='normal')
-            self.is_downloading = False
+            # Report without waiting, so this job frees its slot right away
+            self._on_ui_thread(self._job_finished, job, result)
+    
+    def _job_finished(self, job, result):
+        """
+        Record a finished job on the UI thread
+        
+        Results are collected and shown in a single dialog once no other
+        job is queued or running, instead of one modal dialog per job.
+        
+        Args:
+            job: The finished DownloadJob
+            result: (title, message) to report, or None (e.g. cancelled)
+        """
+        self._finished_jobs.append((job, result))
+        
+        # The scheduler may not have removed reported jobs yet, and cancelled
+        # jobs still in the queue will never run
+        reported = [finished for finished, _ in self._finished_jobs]
+        remaining = [
+            active for active in self.scheduler.active_jobs
+            if active not in reported and not active.token.cancelled
+        ]
+        if remaining:
+            return
+        
+        self.cancel_btn.config(state='disabled')
+        results = [result for _, result in self._finished_jobs if result is not None]
+        self._finished_jobs = []
+        if not results:
+            return
+        
+        message = "\n".join(message for _, message in results)
+        if any(title == "Error" for title, _ in results):
+            messagebox.showerror("Error", message)
+        else:
+            messagebox.showinfo("Success", message)
+    
+    def _verify_tracks(self, tracks, verification, cancel_token):
+        """
+        Collect verification results, re-downloading quarantined tracks once
+        
+        Args:
+            tracks: Downloaded tracks, all submitted to the verification pipeline
+            verification: Pipeline the downloader published the tracks into
+            cancel_token: The job's token, so Cancel also stops the retries
+        
+        Returns:
+            The list of tracks with failed entries replaced by their retries
+        """
+        self.log("\nVerifying downloaded files...")
+        failed = verification.finish()
+        if not failed:
+            return tracks
+        
+        tracks = [track for track in tracks if track.state == TrackState.VERIFIED]
+        retries = []
+        for track in failed:
+            self.log(f"Quarantined {track.name}: {track.error}")
+            if track.url is None:
+                tracks.append(track)
+                continue
+            
+            self.log(f"Re-downloading: {track.display_name}")
+            try:
+                retried = self.downloader.download(
+                    track.url,
+                    overwrite=True,
+                    cancel_token=cancel_token,
+                    latest_if_none=False
+                )
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                self.log(f"Re-download failed for {track.display_name}: {str(e)}")
+                tracks.append(track)
+                continue
+            
+            # Only accept a file that is actually this song; anything else
+            # would be imported twice alongside its own entry
+            if track.spotify_id is not None:
+                retried = [retry for retry in retried if retry.spotify_id == track.spotify_id]
+            if not retried:
+                self.log(f"Re-download produced nothing for {track.display_name}")
+                tracks.append(track)
+            retries.extend(retried)
+        
+        for track in self.verifier.verify(retries, cancel_token=cancel_token):
+            self.log(f"Still invalid after re-download, leaving in quarantine: {track.name}")
+        
+        return tracks + retries
+    
+    def _analyze_loudness(self, tracks, cancel_token):
+        """Measure loudness and write gain tags for verified tracks"""
+        self.log("\nAnalyzing loudness...")
+        if self.loudness_analyzer is None:
+            from downloader.loudness import LoudnessAnalyzer
+            self.loudness_analyzer = LoudnessAnalyzer()
+        
+        verified = [track for track in tracks if track.state == TrackState.VERIFIED]
+        failed = self.loudness_analyzer.analyze(
+            verified,
+            progress_callback=lambda current, total, message: self.log(message),
+            cancel_token=cancel_token
+        )
+        self.log(f"Tagged {len(verified) - len(failed)}/{len(verified)} file(s) with gain")
+    
+    def _format_track(self, track):
+        """Format a downloaded track for the log"""
+        details = [f"{track.size / (1024 * 1024):.1f} MB"]
+        if track.duration:
+            minutes, seconds = divmod(int(track.duration), 60)
+            details.append(f"{minutes}:{seconds:02d}")
+        if track.gain is not None:
+            details.append(f"{track.gain:+.1f} dB")
+        if track.spotify_id:
+            details.append(track.spotify_id)
+        return f"{track.display_name} ({', '.join(details)})"
     
     def _download_progress_callback(self, current, total, message=None):
         """Callback for download progress updates"""
@@ -0,0 +1,92 @@
+"""
+Cached environment checks run in the background at startup
+"""
+
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+CACHE_PATH = Path.home() / "Library" / "Caches" / "Spotify to Apple Music Downloader" / "environment.json"
+
+# Cached results are trusted for this long if nothing they depend on changed
+CACHE_TTL = 24 * 3600
+
+
+def _fingerprint(ffmpeg: str) -> dict:
+    """Inputs that invalidate the cached results when they change"""
+    try:
+        ffmpeg_mtime = os.stat(ffmpeg).st_mtime
+    except OSError:
+        ffmpeg_mtime = None
+    # Installing or removing a package touches its site-packages directory
+    package_mtimes = {}
+    for entry in sys.path:
+        try:
+            package_mtimes[entry] = os.stat(entry or '.').st_mtime
+        except OSError:
+            pass
+    return {
+        'executable': sys.executable,
+        'python': sys.version,
+        'path': os.environ.get('PATH', ''),
+        'ffmpeg': ffmpeg,
+        'ffmpeg_mtime': ffmpeg_mtime,
+        'packages': package_mtimes,
+    }
+
+
+def _run_checks(ffmpeg: str) -> dict:
+    """Probe the environment; the ffmpeg call is the expensive part"""
+    try:
+        ffmpeg_ok = subprocess.run(
+            [ffmpeg, '-version'],
+            capture_output=True,
+            timeout=10
+        ).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        ffmpeg_ok = False
+
+    return {
+        'ffmpeg': ffmpeg if ffmpeg_ok else None,
+        'spotdl': importlib.util.find_spec('spotdl') is not None,
+        'mutagen': importlib.util.find_spec('mutagen') is not None,
+        'numpy': importlib.util.find_spec('numpy') is not None,
+        'macos': platform.system() == "Darwin",
+    }
+
+
+def check_environment(cache_path: Path = CACHE_PATH) -> dict:
+    """
+    Return dependency availability, reusing the on-disk cache when valid
+
+    Returns:
+        Dictionary with 'ffmpeg' (path or None) and booleans for 'spotdl',
+        'mutagen', 'numpy' and 'macos'
+    """
+    from downloader.spotify_downloader import find_ffmpeg
+
+    fingerprint = _fingerprint(find_ffmpeg())
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached['fingerprint'] == fingerprint and time.time() - cached['checked_at'] < CACHE_TTL:
+            return cached['results']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    results = _run_checks(fingerprint['ffmpeg'])
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = cache_path.with_suffix('.tmp')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'checked_at': time.time(), 'results': results}, f)
+        os.replace(temporary, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not cache environment checks: {e}")
+    return results
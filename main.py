@@ -4,14 +4,46 @@ Spotify to Apple Music Downloader
 Main application entry point
 """
 
+import multiprocessing
+import os
+import sys
+import time
 import tkinter as tk
 from gui.app import MusicDownloaderApp
+from profiling.profiler import PROFILE_ENV
+
+
+# When set, print the wall-clock time of the first paint and exit (used by
+# tools/benchmark_startup.py)
+STARTUP_PROBE_ENV = 'SPOTIFY_DOWNLOADER_STARTUP_PROBE'
+
+
+def _report_first_paint(root):
+    """Print when the window has been mapped and drawn, then quit"""
+    def report():
+        print(f"first-paint {time.time():.6f}", flush=True)
+        root.destroy()
+    
+    def on_map(event):
+        if event.widget is root:
+            root.after_idle(report)
+    
+    root.bind('<Map>', on_map)
 
 
 def main():
     """Initialize and run the application"""
+    # Required for process pools in the frozen app bundle
+    multiprocessing.freeze_support()
+    
+    # --profile enables per-job profiling bundles (see profiling/profiler.py)
+    if '--profile' in sys.argv:
+        os.environ.setdefault(PROFILE_ENV, '1')
+    
     root = tk.Tk()
     app = MusicDownloaderApp(root)
+    if os.environ.get(STARTUP_PROBE_ENV):
+        _report_first_paint(root)
     root.mainloop()
 
 
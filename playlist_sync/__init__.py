@@ -0,0 +1 @@
+"""Scheduled mirroring of many Spotify playlists"""
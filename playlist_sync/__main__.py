@@ -0,0 +1,44 @@
+"""
+Command line entry point for the playlist sync daemon
+
+Usage:
+    python -m playlist_sync run [--config FILE]
+    python -m playlist_sync status [--config FILE]
+"""
+
+import argparse
+import signal
+import sys
+from pathlib import Path
+
+from playlist_sync.config import DEFAULT_CONFIG_PATH, SyncConfig
+from playlist_sync.daemon import DEFAULT_STATE_DIR, SyncDaemon
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m playlist_sync')
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--config', default=str(DEFAULT_CONFIG_PATH))
+    parser.add_argument('--state-dir', default=str(DEFAULT_STATE_DIR))
+    args = parser.parse_args()
+
+    config = SyncConfig.load(Path(args.config).expanduser())
+    if args.command == 'status':
+        # Status only reads saved state; never touch Apple Music
+        config.import_to_music = False
+    daemon = SyncDaemon(config, Path(args.state_dir).expanduser())
+
+    if args.command == 'status':
+        print(daemon.status())
+        return 0
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
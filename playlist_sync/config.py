@@ -0,0 +1,96 @@
+"""
+Sync daemon configuration file
+
+Example:
+    {
+        "max_concurrent": 4,
+        "cycle_minutes": 60,
+        "max_mb_per_cycle": 2000,
+        "jitter_minutes": 10,
+        "import": true,
+        "playlists": [
+            {"url": "https://open.spotify.com/playlist/...", "interval_hours": 24},
+            {"url": "https://open.spotify.com/playlist/...", "interval_hours": 6, "weight": 2}
+        ]
+    }
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import List, Optional
+
+
+DEFAULT_CONFIG_PATH = Path.home() / ".config" / "spotify-to-apple-music" / "sync.json"
+
+
+class PlaylistConfig:
+    """One mirrored playlist"""
+
+    __slots__ = ('url', 'name', 'interval', 'weight')
+
+    def __init__(self, url: str, name: Optional[str] = None, interval_hours: float = 24.0, weight: float = 1.0):
+        if 'spotify.com' not in url:
+            raise ValueError(f"Not a Spotify URL: {url}")
+        if interval_hours <= 0 or weight <= 0:
+            raise ValueError(f"interval_hours and weight must be positive for {url}")
+        self.url = url
+        self.name = name or url.rstrip('/').rsplit('/', 1)[-1].split('?')[0]
+        self.interval = interval_hours * 3600
+        self.weight = weight
+
+    @property
+    def key(self) -> str:
+        """Stable identifier used for state and working directories"""
+        return hashlib.sha1(self.url.encode('utf-8')).hexdigest()[:12]
+
+
+class SyncConfig:
+    """Daemon-wide limits and the playlists to mirror"""
+
+    def __init__(
+        self,
+        playlists: List[PlaylistConfig],
+        max_concurrent: int = 4,
+        cycle_minutes: float = 60.0,
+        max_mb_per_cycle: Optional[float] = None,
+        jitter_minutes: float = 10.0,
+        import_to_music: bool = True
+    ):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self.playlists = playlists
+        self.max_concurrent = max_concurrent
+        self.cycle = cycle_minutes * 60
+        self.max_bytes_per_cycle = int(max_mb_per_cycle * 1024 * 1024) if max_mb_per_cycle else None
+        self.jitter = jitter_minutes * 60
+        self.import_to_music = import_to_music
+
+    @classmethod
+    def load(cls, path: Path) -> 'SyncConfig':
+        """Read and validate a JSON config file"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        playlists = []
+        seen = set()
+        for entry in data.get('playlists', []):
+            playlist = PlaylistConfig(
+                entry['url'],
+                name=entry.get('name'),
+                interval_hours=float(entry.get('interval_hours', 24)),
+                weight=float(entry.get('weight', 1))
+            )
+            if playlist.key in seen:
+                continue
+            seen.add(playlist.key)
+            playlists.append(playlist)
+
+        return cls(
+            playlists,
+            max_concurrent=int(data.get('max_concurrent', 4)),
+            cycle_minutes=float(data.get('cycle_minutes', 60)),
+            max_mb_per_cycle=data.get('max_mb_per_cycle'),
+            jitter_minutes=float(data.get('jitter_minutes', 10)),
+            import_to_music=bool(data.get('import', True))
+        )
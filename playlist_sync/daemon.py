@@ -0,0 +1,338 @@
+"""
+Long-running daemon that keeps many playlists mirrored
+
+Refreshes are scheduled by weighted lateness: among playlists that are due,
+the one with the largest (time overdue x weight) runs first. At most
+max_concurrent refreshes run at once, so one huge playlist only ever holds
+a single slot while the rest keep flowing. Each refresh passes a per-playlist
+spotdl archive, so only songs added since the last run are downloaded.
+Songs that were downloaded but not imported (Music rejected them, or the
+daemon stopped first) are remembered and imported on the next refresh.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from downloader.cancellation import DownloadCancelled
+from downloader.scheduler import DownloadJob, JobPriority, JobScheduler
+from downloader.spotify_downloader import SpotifyDownloader
+from downloader.track import Track, TrackState
+from downloader.verifier import TrackVerifier
+from playlist_sync.config import PlaylistConfig, SyncConfig
+
+
+DEFAULT_STATE_DIR = Path.home() / "Library" / "Application Support" / "Spotify to Apple Music Downloader" / "sync"
+
+# First retry delay after a failed refresh; doubles per consecutive failure
+RETRY_BASE = 300.0
+
+# Seconds between scheduling passes
+TICK_INTERVAL = 1.0
+
+# Seconds to wait for cancelled refreshes to wind down when stopping
+SHUTDOWN_TIMEOUT = 10.0
+
+
+class PlaylistHealth:
+    """Persisted scheduling state and statistics for one playlist"""
+
+    FIELDS = (
+        'next_due', 'last_started', 'last_success', 'last_error',
+        'consecutive_failures', 'runs', 'failures', 'tracks_downloaded',
+        'bytes_downloaded', 'last_duration', 'average_duration',
+        'pending_imports',
+    )
+
+    def __init__(self, next_due: float = 0.0):
+        self.next_due = next_due
+        self.last_started = None
+        self.last_success = None
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.runs = 0
+        self.failures = 0
+        self.tracks_downloaded = 0
+        self.bytes_downloaded = 0
+        self.last_duration = None
+        self.average_duration = None
+        # File names in the playlist's work directory still to be imported
+        self.pending_imports = []
+
+    def record(self, started: float, finished: float, tracks: int, size: int, error: Optional[str]):
+        """Update the statistics with the outcome of one refresh"""
+        duration = finished - started
+        self.runs += 1
+        self.last_duration = duration
+        if self.average_duration is None:
+            self.average_duration = duration
+        else:
+            self.average_duration += (duration - self.average_duration) / self.runs
+        self.tracks_downloaded += tracks
+        self.bytes_downloaded += size
+        if error is None:
+            self.last_success = finished
+            self.last_error = None
+            self.consecutive_failures = 0
+        else:
+            self.last_error = error
+            self.failures += 1
+            self.consecutive_failures += 1
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'PlaylistHealth':
+        health = cls()
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(health, field, data[field])
+        return health
+
+
+class SyncDaemon:
+    """Schedules playlist refreshes fairly under concurrency and bandwidth caps"""
+
+    def __init__(self, config: SyncConfig, state_dir: Path = DEFAULT_STATE_DIR):
+        self.config = config
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.state_path = self.state_dir / 'state.json'
+        self.health: Dict[str, PlaylistHealth] = self._load_state()
+        self.importer = None
+        if config.import_to_music:
+            from apple_music.importer import AppleMusicImporter
+            self.importer = AppleMusicImporter()
+
+        self.scheduler = JobScheduler(
+            self._refresh,
+            max_workers=config.max_concurrent,
+            reserved_interactive=0
+        )
+        self._jobs: Dict[DownloadJob, PlaylistConfig] = {}
+        self._running = set()
+        self._lock = threading.Lock()
+        # Serializes writers of state.json; _lock only guards the snapshot
+        self._save_lock = threading.Lock()
+        self._cycle_started = time.time()
+        self._cycle_bytes = 0
+        self.stop_event = threading.Event()
+
+    def _load_state(self) -> Dict[str, PlaylistHealth]:
+        """Restore saved state, spreading never-seen playlists over the jitter window"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+
+        now = time.time()
+        health = {}
+        for playlist in self.config.playlists:
+            if playlist.key in saved:
+                health[playlist.key] = PlaylistHealth.from_dict(saved[playlist.key])
+            else:
+                health[playlist.key] = PlaylistHealth(now + random.uniform(0, self.config.jitter))
+        return health
+
+    def _save_state(self):
+        with self._save_lock:
+            with self._lock:
+                data = {key: health.to_dict() for key, health in self.health.items()}
+            temporary = self.state_path.with_suffix('.tmp')
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temporary, self.state_path)
+
+    def run(self):
+        """Schedule refreshes until stop() is called"""
+        print(f"Mirroring {len(self.config.playlists)} playlist(s), "
+              f"{self.config.max_concurrent} at a time")
+        try:
+            while not self.stop_event.wait(TICK_INTERVAL):
+                self._tick(time.time())
+        finally:
+            self.scheduler.shutdown()
+            self._wait_for_refreshes(SHUTDOWN_TIMEOUT)
+            self._save_state()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _wait_for_refreshes(self, timeout: float):
+        """Give cancelled refreshes a moment to record what they downloaded"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._running:
+                    return
+            time.sleep(0.05)
+
+    def _tick(self, now: float):
+        """Start the most overdue playlists that fit in the free slots"""
+        with self._lock:
+            if now - self._cycle_started >= self.config.cycle:
+                self._cycle_started = now
+                self._cycle_bytes = 0
+
+            budget = self.config.max_bytes_per_cycle
+            if budget is not None and self._cycle_bytes >= budget:
+                return
+
+            free = self.config.max_concurrent - len(self._running)
+            if free <= 0:
+                return
+
+            due = [
+                playlist for playlist in self.config.playlists
+                if playlist.key not in self._running
+                and self.health[playlist.key].next_due <= now
+            ]
+            due.sort(
+                key=lambda p: (now - self.health[p.key].next_due) * p.weight,
+                reverse=True
+            )
+            for playlist in due[:free]:
+                self._running.add(playlist.key)
+                job = self.scheduler.submit(playlist.url, priority=JobPriority.BULK)
+                self._jobs[job] = playlist
+
+    def _refresh(self, job: DownloadJob):
+        """Download, verify and import whatever is new in one playlist"""
+        with self._lock:
+            playlist = self._jobs.pop(job)
+        health = self.health[playlist.key]
+        started = time.time()
+        tracks = []
+        published = []
+        error = None
+
+        work_dir = self.state_dir / playlist.key
+        archive = work_dir / 'archive.txt'
+        verifier = TrackVerifier(work_dir / '.quarantine')
+        try:
+            downloader = SpotifyDownloader(work_dir)
+            with verifier.pipeline(job.token) as verification:
+                def publish(track):
+                    published.append(track)
+                    verification.submit(track)
+
+                tracks = downloader.download(
+                    playlist.url,
+                    cancel_token=job.token,
+                    archive=archive,
+                    publish_callback=publish
+                )
+                failed = verification.finish()
+            # Let the next refresh try bad songs again
+            self._forget(archive, [track.url for track in failed if track.url])
+            if self.importer is not None:
+                error = self._import(work_dir, verifier, health, tracks, job)
+        except DownloadCancelled:
+            # Stopping is not a failure: the schedule and statistics stay as
+            # they were, but finished songs are remembered for import
+            with self._lock:
+                if self.importer is not None:
+                    self._add_pending(health, [
+                        track.name for track in published if track.state != TrackState.FAILED
+                    ])
+                self._running.discard(playlist.key)
+            self._save_state()
+            raise
+        except Exception as e:
+            error = str(e)
+
+        finished = time.time()
+        size = sum(track.size for track in tracks)
+        with self._lock:
+            health.last_started = started
+            health.record(started, finished, len(tracks), size, error)
+            health.next_due = finished + self._next_delay(playlist, health)
+            self._cycle_bytes += size
+            self._running.discard(playlist.key)
+        self._save_state()
+
+        status = f"failed: {error}" if error else f"{len(tracks)} new track(s)"
+        print(f"[{playlist.name}] refreshed in {finished - started:.0f}s, {status}")
+
+    def _import(
+        self,
+        work_dir: Path,
+        verifier: TrackVerifier,
+        health: PlaylistHealth,
+        tracks,
+        job: DownloadJob
+    ) -> Optional[str]:
+        """
+        Import new verified tracks and any left over from earlier refreshes
+
+        spotdl has already archived these songs, so a track Music rejects is
+        kept on disk and retried on the next refresh instead of re-downloaded.
+
+        Returns:
+            Error message if any track failed to import, otherwise None
+        """
+        with self._lock:
+            pending = list(health.pending_imports)
+        retries = [
+            Track(work_dir / name, state=TrackState.DOWNLOADED)
+            for name in pending
+            if (work_dir / name).exists()
+        ]
+        verifier.verify(retries, cancel_token=job.token)
+
+        candidates = [track for track in retries + list(tracks) if track.state == TrackState.VERIFIED]
+        results = self.importer.import_tracks(candidates)
+        with self._lock:
+            health.pending_imports = [track.name for track in results['failed']]
+
+        if not results['failed']:
+            return None
+        first = results['failed'][0]
+        return (
+            f"{len(results['failed'])} track(s) failed to import, will retry: "
+            f"{first.error or 'unknown error'}"
+        )
+
+    def _add_pending(self, health: PlaylistHealth, names):
+        """Remember file names still to be imported (caller holds _lock)"""
+        for name in names:
+            if name not in health.pending_imports:
+                health.pending_imports.append(name)
+
+    def _next_delay(self, playlist: PlaylistConfig, health: PlaylistHealth) -> float:
+        """Interval (or failure backoff) plus jitter so refreshes do not line up"""
+        if health.consecutive_failures:
+            delay = min(playlist.interval, RETRY_BASE * 2 ** (health.consecutive_failures - 1))
+        else:
+            delay = playlist.interval
+        return delay + random.uniform(0, self.config.jitter)
+
+    def _forget(self, archive: Path, urls):
+        """Remove song URLs from a spotdl archive"""
+        urls = set(urls)
+        if not urls or not archive.exists():
+            return
+        with open(archive, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip() not in urls]
+        with open(archive, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+    def status(self) -> str:
+        """Format per-playlist health for display"""
+        now = time.time()
+        lines = [f"{'playlist':<30} {'runs':>5} {'fails':>5} {'tracks':>7} {'avg (s)':>8} {'next in':>8}  last error"]
+        for playlist in self.config.playlists:
+            health = self.health[playlist.key]
+            average = f"{health.average_duration:.0f}" if health.average_duration is not None else "-"
+            lines.append(
+                f"{playlist.name[:30]:<30} {health.runs:>5} {health.failures:>5} "
+                f"{health.tracks_downloaded:>7} {average:>8} "
+                f"{max(0, health.next_due - now) / 60:>7.0f}m  {health.last_error or ''}"
+            )
+        return '\n'.join(lines)
@@ -0,0 +1 @@
+"""Opt-in profiling support for diagnosing slow downloads and imports"""
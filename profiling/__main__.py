@@ -0,0 +1,49 @@
+"""
+Compare two profiling bundles
+
+Usage:
+    python -m profiling <old bundle> <new bundle>
+"""
+
+import json
+import sys
+from pathlib import Path
+
+
+def load_summary(bundle: str) -> dict:
+    """Load summary.json from a bundle directory"""
+    with open(Path(bundle) / 'summary.json', 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(old: dict, new: dict) -> str:
+    """Format a per-stage wall-time comparison of two bundle summaries"""
+    lines = [f"{'stage':<20} {'old (s)':>10} {'new (s)':>10} {'change':>9}"]
+    rows = [('total', old['total_wall_time'], new['total_wall_time'])]
+    for name in sorted(set(old['stages']) | set(new['stages'])):
+        rows.append((
+            name,
+            old['stages'].get(name, {}).get('wall_time', 0.0),
+            new['stages'].get(name, {}).get('wall_time', 0.0),
+        ))
+
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{name:<20} {before:>10.3f} {after:>10.3f} {change:>9}")
+
+    lines.append(
+        f"{'peak memory (MB)':<20} {old['peak_memory'] / 1e6:>10.1f} {new['peak_memory'] / 1e6:>10.1f}"
+    )
+    return '\n'.join(lines)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__.strip())
+        return 2
+    print(compare(load_summary(sys.argv[1]), load_summary(sys.argv[2])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Opt-in cProfile/tracemalloc capture for the download and import stages
+
+Profiling is enabled by setting the SPOTIFY_DOWNLOADER_PROFILE environment
+variable (or launching with --profile). Set it to "1" to write bundles to the
+default location, or to a directory path to write them there.
+
+Each job produces one bundle directory containing:
+    <stage>.pstats      cProfile data, accumulated over every call of the stage
+    spotdl-<n>.pstats   cProfile data from the spotdl child process
+    allocations.txt     Top allocation sites (tracemalloc) over the whole job
+    summary.json        Wall-time breakdown, call counts and memory per stage
+"""
+
+import cProfile
+import functools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+
+PROFILE_ENV = 'SPOTIFY_DOWNLOADER_PROFILE'
+
+DEFAULT_PROFILE_DIR = Path.home() / "Library" / "Logs" / "Spotify to Apple Music Downloader" / "profiles"
+
+# Number of allocation sites written to the bundle
+TOP_ALLOCATIONS = 25
+
+# tracemalloc frames kept per allocation
+TRACEMALLOC_FRAMES = 10
+
+_active_session = None
+
+
+def profile_dir_from_environment() -> Optional[Path]:
+    """Return the directory bundles should be written to, or None if disabled"""
+    value = os.environ.get(PROFILE_ENV, '').strip()
+    if not value or value.lower() in ('0', 'false', 'no', 'off'):
+        return None
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return DEFAULT_PROFILE_DIR
+    return Path(value).expanduser()
+
+
+def active_session() -> Optional['ProfileSession']:
+    """Return the profiling session for the running job, if any"""
+    return _active_session
+
+
+class _StageStats:
+    """Accumulated measurements for one named stage"""
+
+    __slots__ = ('profiler', 'calls', 'wall_time', 'memory_delta')
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.calls = 0
+        self.wall_time = 0.0
+        self.memory_delta = 0
+
+
+class ProfileSession:
+    """
+    Collects profiling data for a single job into one bundle directory
+
+    Stages may nest (e.g. the worker wraps the download). Only one cProfile
+    profiler can be active per thread, so the enclosing stage is paused
+    while a nested stage runs; its pstats therefore hold exclusive time while
+    the wall-time breakdown in summary.json is inclusive.
+    """
+
+    def __init__(self, name: str, base_dir: Path):
+        self.name = name
+        Path(base_dir).mkdir(parents=True, exist_ok=True)
+        # The random suffix keeps jobs finishing in the same second apart
+        self.bundle_dir = Path(tempfile.mkdtemp(
+            prefix=f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-",
+            dir=base_dir
+        ))
+        self.stages = {}
+        self.child_profiles = []
+        self._stack = threading.local()
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._baseline = tracemalloc.take_snapshot()
+
+    @classmethod
+    def start(cls, name: str) -> Optional['ProfileSession']:
+        """
+        Start a session if profiling is enabled in the environment
+
+        Only one session can be active at a time: cProfile cannot profile
+        overlapping threads reliably and tracemalloc is process-wide. Callers
+        that run jobs concurrently must run them one at a time while
+        profiling is enabled.
+
+        Returns:
+            The new active session, or None when profiling is disabled or a
+            session is already active
+        """
+        global _active_session
+        base_dir = profile_dir_from_environment()
+        if base_dir is None or _active_session is not None:
+            return None
+        _active_session = cls(name, base_dir)
+        return _active_session
+
+    def child_profile_path(self, name: str) -> Path:
+        """Reserve a pstats path for a child process to write to"""
+        with self._lock:
+            path = self.bundle_dir / f"{name}-{len(self.child_profiles) + 1}.pstats"
+            self.child_profiles.append(path.name)
+        return path
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profile the enclosed block as part of the named stage"""
+        with self._lock:
+            stats = self.stages.setdefault(name, _StageStats())
+        stack = getattr(self._stack, 'stages', None)
+        if stack is None:
+            stack = self._stack.stages = []
+
+        if stack:
+            stack[-1].profiler.disable()
+        stack.append(stats)
+
+        memory_before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        stats.profiler.enable()
+        try:
+            yield
+        finally:
+            stats.profiler.disable()
+            stats.wall_time += time.perf_counter() - started
+            stats.memory_delta += tracemalloc.get_traced_memory()[0] - memory_before
+            stats.calls += 1
+            stack.pop()
+            if stack:
+                stack[-1].profiler.enable()
+
+    def finish(self) -> Path:
+        """
+        Write the bundle and stop tracing
+
+        Returns:
+            Path to the bundle directory
+        """
+        global _active_session
+        if _active_session is self:
+            _active_session = None
+
+        total_wall = time.perf_counter() - self._started_at
+        snapshot = tracemalloc.take_snapshot()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        top_allocations = snapshot.compare_to(self._baseline, 'lineno')[:TOP_ALLOCATIONS]
+        with open(self.bundle_dir / 'allocations.txt', 'w', encoding='utf-8') as f:
+            for stat in top_allocations:
+                f.write(f"{stat}\n")
+
+        stages = {}
+        for name, stats in self.stages.items():
+            pstats_file = f"{name}.pstats"
+            stats.profiler.dump_stats(str(self.bundle_dir / pstats_file))
+            stages[name] = {
+                'calls': stats.calls,
+                'wall_time': round(stats.wall_time, 6),
+                'memory_delta': stats.memory_delta,
+                'pstats': pstats_file,
+            }
+
+        summary = {
+            'name': self.name,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'total_wall_time': round(total_wall, 6),
+            'peak_memory': peak_memory,
+            'stages': stages,
+            'child_profiles': self.child_profiles,
+            'top_allocations': [str(stat) for stat in top_allocations],
+        }
+        with open(self.bundle_dir / 'summary.json', 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+        return self.bundle_dir
+
+
+@contextmanager
+def stage(name: str):
+    """Profile the enclosed block if a session is active, otherwise do nothing"""
+    session = _active_session
+    if session is None:
+        yield
+        return
+    with session.stage(name):
+        yield
+
+
+def profiled(name: str):
+    """Decorator that profiles every call of a function as the named stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _active_session
+            if session is None:
+                return func(*args, **kwargs)
+            with session.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -106,8 +106,42 @@ if in_app_bundle:
             print(f"[DEBUG] No ffmpeg available in bundle or system paths", file=sys.stderr)
             # let spotdl handle the missing ffmpeg error
 
+# Profiling flag passed by the app; must be removed before spotdl parses argv
+profile_output = None
+if '--profile-output' in sys.argv:
+    index = sys.argv.index('--profile-output')
+    if index + 1 < len(sys.argv):
+        profile_output = sys.argv[index + 1]
+    del sys.argv[index:index + 2]
+
+
+def run_profiled(entry_point, output):
+    """Run spotdl under cProfile and tracemalloc, writing results next to output"""
+    import cProfile
+    import tracemalloc
+
+    tracemalloc.start(10)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        entry_point()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output)
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        with open(os.path.splitext(output)[0] + '.allocations.txt', 'w', encoding='utf-8') as f:
+            f.write(f"Peak traced memory: {peak} bytes\n")
+            for stat in snapshot.statistics('lineno')[:25]:
+                f.write(f"{stat}\n")
+
+
 # Now import and run spotdl
 from spotdl.console import console_entry_point
 
 if __name__ == "__main__":
-    console_entry_point()
+    if profile_output:
+        run_profiled(console_entry_point, profile_output)
+    else:
+        console_entry_point()
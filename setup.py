@@ -30,6 +30,7 @@ OPTIONS = {
     'packages': [
         'tkinter',
         'mutagen',
+        'numpy',
         'asyncio',
         'concurrent',
         'spotdl',
@@ -44,8 +45,16 @@ OPTIONS = {
     ],
     'includes': [
         'gui.app',
+        'gui.startup',
         'downloader.spotify_downloader',
+        'downloader.cancellation',
+        'downloader.diskio',
+        'downloader.scheduler',
+        'downloader.track',
+        'downloader.verifier',
+        'downloader.loudness',
         'apple_music.importer',
+        'profiling.profiler',
         'http.cookies',
         'http.cookiejar',
     ],
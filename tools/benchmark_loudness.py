@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark loudness analysis throughput on synthetic audio
+
+Measures tracks per second on one core and across a process pool, using
+generated 48 kHz stereo PCM fed to the meter in the same windows that
+ffmpeg output is read in. Decoding and tagging are not included.
+
+Usage:
+    python tools/benchmark_loudness.py [--tracks N] [--seconds S] [--workers W]
+"""
+
+import argparse
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from downloader.loudness import CHANNELS, SAMPLE_RATE, WINDOW_FRAMES, LoudnessMeter
+
+
+def synthetic_track(seconds: float, seed: int):
+    """Generate a pink-ish noise plus tone track at a random level"""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * SAMPLE_RATE)
+    t = np.arange(frames, dtype=np.float32) / SAMPLE_RATE
+    tone = np.sin(2 * np.pi * rng.uniform(100, 2000) * t)
+    noise = np.cumsum(rng.standard_normal(frames).astype(np.float32)) * 0.01
+    noise -= noise.mean()
+    level = 10 ** (rng.uniform(-20, -3) / 20)
+    mono = (0.5 * tone + 0.5 * np.tanh(noise)) * level
+    return np.repeat(mono[:, None], CHANNELS, axis=1).astype(np.float32)
+
+
+def measure(samples) -> float:
+    """Run the meter over a track window by window"""
+    meter = LoudnessMeter()
+    for start in range(0, len(samples), WINDOW_FRAMES):
+        meter.add(samples[start:start + WINDOW_FRAMES])
+    return meter.integrated_loudness()
+
+
+@functools.lru_cache(maxsize=1)
+def _cached_track(seconds: float):
+    return synthetic_track(seconds, 0)
+
+
+def measure_synthetic(seconds: float) -> float:
+    """Pool task: measure a track generated once per worker process"""
+    return measure(_cached_track(seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tracks', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=210.0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    tracks = [synthetic_track(args.seconds, seed) for seed in range(min(args.tracks, 4))]
+    started = time.perf_counter()
+    for i in range(args.tracks):
+        measure(tracks[i % len(tracks)])
+    single = args.tracks / (time.perf_counter() - started)
+    print(f"Single core: {single:.2f} tracks/s ({single * args.seconds:.0f}x realtime)")
+
+    jobs = [args.seconds] * args.tracks
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Warm up so every worker has generated its track
+        list(executor.map(measure_synthetic, [args.seconds] * args.workers * 2))
+        started = time.perf_counter()
+        list(executor.map(measure_synthetic, jobs))
+        pooled = args.tracks / (time.perf_counter() - started)
+    print(
+        f"{args.workers} workers: {pooled:.2f} tracks/s "
+        f"({pooled / args.workers:.2f} tracks/s per core)"
+    )
+
+
+if __name__ == "__main__":
+    main()
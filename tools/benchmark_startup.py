@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark GUI cold start and enforce a startup budget
+
+Measures, in fresh interpreters:
+    - the time to import gui.app, and that it does not pull in the heavy
+      subsystems (downloader, importer, mutagen, NumPy) that load lazily
+    - the time from launching main.py to the first paint of the window
+
+Exits non-zero when a budget is exceeded, so it can run in CI.
+
+Usage:
+    python tools/benchmark_startup.py [--runs N] [--import-budget-ms MS]
+                                      [--paint-budget-ms MS] [--imports-only]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must only load after the window is shown
+LAZY_MODULES = [
+    'downloader.spotify_downloader',
+    'downloader.verifier',
+    'downloader.loudness',
+    'apple_music.importer',
+    'gui.startup',
+    'mutagen',
+    'numpy',
+]
+
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import gui.app
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+''' % (LAZY_MODULES,)
+
+
+def measure_import() -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE],
+        capture_output=True,
+        text=True,
+        cwd=str(ROOT),
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_first_paint() -> float:
+    env = dict(os.environ, SPOTIFY_DOWNLOADER_STARTUP_PROBE='1')
+    started = time.time()
+    result = subprocess.run(
+        [sys.executable, str(ROOT / 'main.py')],
+        capture_output=True,
+        text=True,
+        cwd=str(ROOT),
+        env=env,
+        timeout=60
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('first-paint '):
+            return float(line.split()[1]) - started
+    raise Exception(f"main.py did not report a first paint:\n{result.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=250.0)
+    parser.add_argument('--paint-budget-ms', type=float, default=1500.0)
+    parser.add_argument('--imports-only', action='store_true',
+                        help='Skip the first-paint measurement (no display needed)')
+    args = parser.parse_args()
+
+    failures = []
+
+    samples = [measure_import() for _ in range(args.runs)]
+    import_ms = statistics.median(sample['seconds'] for sample in samples) * 1000
+    loaded = sorted({module for sample in samples for module in sample['loaded']})
+    print(f"import gui.app: {import_ms:.0f} ms (budget {args.import_budget_ms:.0f} ms)")
+    if import_ms > args.import_budget_ms:
+        failures.append("import time over budget")
+    if loaded:
+        print(f"eagerly loaded: {', '.join(loaded)}")
+        failures.append("heavy modules imported before first paint")
+
+    if not args.imports_only:
+        paint_ms = statistics.median(measure_first_paint() for _ in range(args.runs)) * 1000
+        print(f"time to first paint: {paint_ms:.0f} ms (budget {args.paint_budget_ms:.0f} ms)")
+        if paint_ms > args.paint_budget_ms:
+            failures.append("time to first paint over budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
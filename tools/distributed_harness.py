@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Run the distributed download service end to end on localhost
+
+Starts a coordinator in this process and several worker processes, with
+spotdl replaced by a stub that writes small valid MP3 files, then submits a
+job and kills one worker while it holds a lease. Passes if every song is
+uploaded, verified and published and the killed worker's lease was
+reclaimed by another worker.
+
+Usage:
+    python tools/distributed_harness.py [--workers N] [--songs N] [--lease-timeout S]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from distributed.coordinator import Coordinator, CoordinatorServer
+from distributed.protocol import CoordinatorClient
+from downloader.spotify_downloader import SpotifyDownloader
+from downloader.track import Track, TrackState
+
+
+# One MPEG-1 Layer III frame (128 kbps, 44.1 kHz) lasts 1152 / 44100 seconds
+MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+FRAMES_PER_SECOND = 44100 / 1152
+
+SONG_DURATION = 10
+
+
+def stub_songs(count: int):
+    """Song dictionaries in the shape spotdl's save operation produces"""
+    return [
+        {
+            'song_id': f"stub{i:04d}",
+            'name': f"Song {i}",
+            'artists': ['Harness'],
+            'duration': SONG_DURATION,
+            'url': f"https://open.spotify.com/track/stub{i:04d}",
+        }
+        for i in range(count)
+    ]
+
+
+class StubDownloader(SpotifyDownloader):
+    """Writes a valid MP3 of the expected length instead of running spotdl"""
+
+    def __init__(self, output_dir: Path, delay: float):
+        super().__init__(output_dir)
+        self.delay = delay
+
+    def download(self, url: str, **kwargs):
+        song_id = url.rstrip('/').rsplit('/', 1)[-1]
+        time.sleep(self.delay)
+        path = self.output_dir / f"Harness - {song_id}.mp3"
+        with open(path, 'wb') as f:
+            f.write(MP3_FRAME * int(SONG_DURATION * FRAMES_PER_SECOND))
+        return [Track(
+            path,
+            spotify_id=song_id,
+            size=os.path.getsize(path),
+            duration=SONG_DURATION,
+            state=TrackState.DOWNLOADED,
+        )]
+
+
+def run_worker(args):
+    """Worker process entry point"""
+    from distributed.worker import DownloadWorker
+
+    worker = DownloadWorker(
+        CoordinatorClient(args.coordinator),
+        Path(args.work_dir),
+        worker_id=args.id,
+        poll_interval=0.2,
+        lease_timeout=args.lease_timeout
+    )
+    worker.downloader = StubDownloader(worker.work_dir, args.delay)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+def spawn_worker(url: str, work_dir: str, worker_id: str, args) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, __file__, 'worker',
+            '--coordinator', url,
+            '--work-dir', work_dir,
+            '--id', worker_id,
+            '--delay', str(args.delay),
+            '--lease-timeout', str(args.lease_timeout),
+        ],
+        stdout=subprocess.DEVNULL,
+        cwd=str(ROOT)
+    )
+
+
+def held_by(coordinator: Coordinator, worker_id: str) -> bool:
+    with coordinator._lock:
+        return any(lease.worker_id == worker_id for lease in coordinator._leases.values())
+
+
+def run_harness(args):
+    base = Path(tempfile.mkdtemp(prefix='distributed-harness-'))
+    output_dir = base / 'output'
+    coordinator = Coordinator(
+        output_dir,
+        lambda url: stub_songs(args.songs),
+        lease_timeout=args.lease_timeout
+    )
+    server = CoordinatorServer(('127.0.0.1', 0), coordinator)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    workers = {
+        f"worker-{i}": spawn_worker(url, str(base / 'work'), f"worker-{i}", args)
+        for i in range(args.workers)
+    }
+    failures = []
+    started = time.monotonic()
+    try:
+        job_id = coordinator.submit('https://open.spotify.com/playlist/harness')
+
+        # Kill the first worker while it is in the middle of a lease
+        victim = 'worker-0'
+        deadline = time.monotonic() + args.timeout
+        while not held_by(coordinator, victim):
+            if time.monotonic() > deadline:
+                raise Exception(f"{victim} never took a lease")
+            time.sleep(0.05)
+        workers[victim].send_signal(signal.SIGKILL)
+        workers[victim].wait()
+        print(f"Killed {victim} while it held a lease")
+
+        while coordinator.job_status(job_id)['state'] not in ('done', 'failed'):
+            if time.monotonic() > deadline:
+                raise Exception("Job did not finish in time")
+            time.sleep(0.1)
+
+        status = coordinator.job_status(job_id)
+        published = sorted(path.name for path in output_dir.glob('*.mp3'))
+        by_worker = {}
+        for entry in status['completed']:
+            by_worker[entry['worker_id']] = by_worker.get(entry['worker_id'], 0) + 1
+
+        print(f"Finished in {time.monotonic() - started:.1f}s: "
+              f"{len(status['completed'])}/{status['total']} completed, "
+              f"{len(status['failed'])} failed, {status['reclaimed']} lease(s) reclaimed")
+        for worker_id, count in sorted(by_worker.items()):
+            print(f"  {worker_id}: {count} song(s)")
+
+        if len(status['completed']) != args.songs or status['failed']:
+            failures.append("not every song completed")
+        if len(published) != args.songs:
+            failures.append(f"{len(published)} file(s) published, expected {args.songs}")
+        if status['reclaimed'] < 1:
+            failures.append("the killed worker's lease was not reclaimed")
+        if len(by_worker) < 2:
+            failures.append("songs were not spread across workers")
+    except Exception as e:
+        failures.append(str(e))
+    finally:
+        for process in workers.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGINT)
+        for process in workers.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        server.shutdown()
+        server.server_close()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command')
+
+    worker = commands.add_parser('worker')
+    worker.add_argument('--coordinator', required=True)
+    worker.add_argument('--work-dir', required=True)
+    worker.add_argument('--id', required=True)
+    worker.add_argument('--delay', type=float, required=True)
+    worker.add_argument('--lease-timeout', type=float, required=True)
+
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--songs', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.3,
+                        help='Seconds the stub download takes per song')
+    parser.add_argument('--lease-timeout', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        return run_worker(args)
+    if args.workers < 2:
+        parser.error("--workers must be at least 2 so one can be killed")
+    return run_harness(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())